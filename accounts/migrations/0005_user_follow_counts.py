@@ -0,0 +1,39 @@
+# Generated by Django 3.2.3 on 2026-10-18 13:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def set_follow_counts(apps, schema_editor):
+    # 既存のユーザのフォロワー数・フォロー数をフォローの件数で設定
+    User = apps.get_model('accounts', 'User')
+    Follow = User.follows.through
+    follows = Follow.objects.order_by()
+    User.objects.update(
+        followers_count=Coalesce(Subquery(
+            follows.filter(to_user=OuterRef('pk')).values('to_user').annotate(c=Count('pk')).values('c')), 0),
+        following_count=Coalesce(Subquery(
+            follows.filter(from_user=OuterRef('pk')).values('from_user').annotate(c=Count('pk')).values('c')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_add_introduction_and_followees_to_usermodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='フォロワー数'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='フォロー数'),
+        ),
+        migrations.RunPython(set_follow_counts, migrations.RunPython.noop),
+    ]
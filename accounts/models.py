@@ -1,5 +1,6 @@
 import uuid
 
+from app.model_mixins import SaveExcludedFieldsMixin
 from app.validators import FileSizeValidator
 from django.apps import apps
 from django.contrib import auth
@@ -84,7 +85,7 @@ class UserManager(BaseUserManager):
 
 
 # AbstractUserクラスをcopy
-class User(AbstractBaseUser, PermissionsMixin):
+class User(SaveExcludedFieldsMixin, AbstractBaseUser, PermissionsMixin):
     """
     An abstract base class implementing a fully featured User model with
     admin-compliant permissions.
@@ -122,6 +123,9 @@ class User(AbstractBaseUser, PermissionsMixin):
                              validators=[FileSizeValidator(val=500, byte_type="kb")])
     self_introduction = models.CharField(verbose_name='自己紹介', max_length=250, blank=True)
     follows = models.ManyToManyField('self', verbose_name='フォロー', related_name='followed_by', blank=True, symmetrical=False)
+    # フォロワー数・フォロー数(followsの変更時にapp/signals.pyで更新)
+    followers_count = models.IntegerField(verbose_name='フォロワー数', default=0, editable=False)
+    following_count = models.IntegerField(verbose_name='フォロー数', default=0, editable=False)
     
     is_staff = models.BooleanField(
         _('staff status'),
@@ -149,10 +153,40 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name_plural = _('users')
         # abstract = True
 
+    # F式で更新するカウンタ(全項目の保存の対象外)
+    SAVE_EXCLUDED_FIELDS = {'followers_count', 'following_count'}
+    # 他のユーザのページ(tip一覧・詳細等)にも表示する項目(変更時はそれらのページのcacheを無効化)
+    DISPLAY_FIELDS = ('username', 'icon', 'is_active')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_display_values = instance.get_display_values()
+        return instance
+
+    def get_display_values(self):
+        # 読み込んでいない項目は取得しない(queryを発生させないため)
+        deferred_fields = self.get_deferred_fields()
+        return {name: str(getattr(self, name)) for name in self.DISPLAY_FIELDS if name not in deferred_fields}
+
+    def has_display_changes(self):
+        """他のユーザのページにも表示する項目が、読み込み後(保存後)に変更されたか"""
+        loaded = self.__dict__.get('_loaded_display_values')
+        # 読み込み時の値がない項目がある場合は、変更されたものとする
+        if loaded is None or len(loaded) < len(self.DISPLAY_FIELDS):
+            return True
+        return loaded != self.get_display_values()
+
     def clean(self):
         super().clean()
         self.email = self.__class__.objects.normalize_email(self.email)
 
+    def save(self, *args, **kwargs):
+        # post_save(app/signals.py)で使用するため、保存前に表示する項目の変更有無を記録
+        self._display_changed = self.has_display_changes()
+        super().save(*args, **kwargs)
+        self._loaded_display_values = self.get_display_values()
+
     # 削除
     # def get_full_name(self):
     #     """
@@ -1,17 +1,24 @@
 import os
 import unittest
 import urllib
+from datetime import timedelta
 from unittest import mock
 
 from accounts.tests.factories import UserFactory
 from allauth.account.models import EmailAddress
-from app.models import Notification, Tip
-from app.tests.factories import NotificationFactory, TipFactory
+from app.jobs import run_pending_jobs
+from app.models import Job, Notification, Tip
+from app.stats import get_user_stats
+from app.tasks import WITHDRAWAL_PURGE
+from app.tests.factories import LikeFactory, NotificationFactory, TipFactory
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core import mail
+from django.core.cache import cache
 from django.core.mail import BadHeaderError
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 UserModel = get_user_model()
@@ -43,6 +50,41 @@ class TestProfileView(TestCase):
         self.assertTemplateUsed(response, 'accounts/profile.html')
         self.assertEqual(user, self.user)
 
+    def test_stats(self):
+        """統計が1回のqueryで集計されてcacheされ、tip・お気に入り・フォローの変更でcacheが削除されること"""
+
+        cache.clear()
+        other = UserFactory()
+        with self.captureOnCommitCallbacks(execute=True):
+            public_tip = TipFactory(created_by=self.user, public_set='public')
+            TipFactory(created_by=self.user, public_set='private')
+            other.follows.add(self.user)
+
+        with self.assertNumQueries(1):
+            stats = get_user_stats(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_stats(self.user.pk), stats)
+        self.assertDictEqual(stats, {
+            'private_tips_count': 1, 'public_tips_count': 1, 'liked_count': 0, 'followers_count': 1, 'following_count': 0,
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LikeFactory(tip=public_tip, created_by=other)
+        self.assertEqual(get_user_stats(self.user.pk)['liked_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.follows.add(other)
+        self.assertEqual(get_user_stats(self.user.pk)['following_count'], 1)
+        self.assertEqual(get_user_stats(other.pk)['followers_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            public_tip.delete()
+        self.assertEqual(get_user_stats(self.user.pk)['public_tips_count'], 0)
+
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['stats'], get_user_stats(self.user.pk))
+
 
 class TestProfileEditView(TestCase):
 
@@ -154,6 +196,11 @@ class TestWithdrawalView(TestCase):
         cls.emailaddress = EmailAddress.objects.create(email=cls.user.email, verified=True, primary=True, user=cls.user)
         cls.url =reverse('accounts:withdrawal')
 
+    def run_purge_jobs(self):
+        # 続きのjobがなくなるまで処理
+        while run_pending_jobs(kinds=[WITHDRAWAL_PURGE])[0]:
+            pass
+
     def test_user_must_be_logged_in(self):
         """未ログインユーザはログインページにリダイレクト"""
         
@@ -190,6 +237,8 @@ class TestWithdrawalView(TestCase):
         response = self.client.post(self.url, form_data, follow=True)
         
         self.assertRedirects(response, reverse('accounts:withdrawal_done'), status_code=302, target_status_code=200)
+        self.assertTrue(Notification.objects.filter(pk=self.notification.pk).exists())
+        self.run_purge_jobs()
         
         user = UserModel.objects.get(pk=self.user.pk)
 
@@ -210,6 +259,8 @@ class TestWithdrawalView(TestCase):
         response = self.client.post(self.url, form_data, follow=True)
         
         self.assertRedirects(response, reverse('accounts:withdrawal_done'), status_code=302, target_status_code=200)
+        self.assertTrue(Notification.objects.filter(pk=self.notification.pk).exists())
+        self.run_purge_jobs()
         
         user = UserModel.objects.get(pk=self.user.pk)
 
@@ -221,6 +272,34 @@ class TestWithdrawalView(TestCase):
         self.assertFalse(user.is_active)
 
 
+    @override_settings(WITHDRAWAL_PURGE_BATCH_SIZE=2)
+    def test_purge_in_batches(self):
+        """データは件数を制限したjobに分けて削除され、削除件数が引き継がれること"""
+
+        NotificationFactory.create_batch(2, to_user=self.user)
+        TipFactory.create_batch(2, created_by=self.user, public_set='private')
+        self.client.force_login(self.user)
+        self.client.post(self.url, {'private_tip_has_left': False})
+        self.run_purge_jobs()
+
+        jobs = Job.objects.filter(kind=WITHDRAWAL_PURGE).order_by('pk')
+        self.assertListEqual([job.status for job in jobs], [Job.DONE] * 5)
+        self.assertDictEqual(jobs.last().payload['deleted'], {'notifications': 3, 'tips': 3})
+        self.assertFalse(Notification.objects.filter(to_user=self.user).exists())
+        self.assertFalse(Tip.objects.filter(created_by=self.user, public_set='private').exists())
+        self.assertTrue(Tip.objects.filter(pk=self.public_tip.pk).exists())
+
+    def test_skip_purge_for_reregistered_user(self):
+        """削除前に再登録したユーザのデータは削除されないこと"""
+
+        self.client.force_login(self.user)
+        self.client.post(self.url, {'private_tip_has_left': False})
+        UserModel.objects.filter(pk=self.user.pk).update(is_active=True)
+        self.run_purge_jobs()
+
+        self.assertTrue(Notification.objects.filter(pk=self.notification.pk).exists())
+        self.assertTrue(Tip.objects.filter(pk=self.private_tip.pk).exists())
+
     def test_post_request_send_email(self):
         """postリクエストの正常確認(email)"""
         
@@ -364,3 +443,133 @@ class TestReRegistrationView(TestCase):
         emailaddress = EmailAddress.objects.filter(email=no_user_email)
         self.assertEqual(emailaddress.count(), 0)
         self.assertEqual(len(mail.outbox), 0)
+
+
+class TestFollows(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.follows_url = reverse('accounts:follows', args=[cls.user.pk])
+        cls.followers_url = reverse('accounts:followers', args=[cls.user.pk])
+
+    def test_get_request_to_follows(self):
+        """フォローの投稿数(public)、最新tip、フォロー・フォロワー数が表示されること"""
+
+        followed_user = UserFactory()
+        no_tip_user = UserFactory()
+        self.user.follows.add(followed_user, no_tip_user)
+        no_tip_user.follows.add(followed_user)
+        old_tip = TipFactory(created_by=followed_user, public_set='public')
+        latest_tip = TipFactory(created_by=followed_user, public_set='public')
+        TipFactory(created_by=followed_user, public_set='private')
+        Tip.objects.filter(pk=old_tip.pk).update(updated_at=latest_tip.updated_at - timedelta(days=1))
+
+        response = self.client.get(self.follows_url)
+        follows = {user.pk: user for user in response.context['follows']}
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'accounts/follow.html')
+        self.assertEqual(follows[followed_user.pk].public_tips_count, 2)
+        self.assertEqual(follows[followed_user.pk].latest_tip, latest_tip)
+        self.assertEqual(follows[followed_user.pk].followers_count, 2)
+        self.assertEqual(follows[followed_user.pk].following_count, 0)
+        self.assertEqual(follows[no_tip_user.pk].public_tips_count, 0)
+        self.assertIsNone(follows[no_tip_user.pk].latest_tip)
+        self.assertEqual(follows[no_tip_user.pk].following_count, 1)
+        self.assertContains(response, f'最新Tip：{latest_tip.title}')
+        self.assertContains(response, 'Tipはありません。')
+
+    def test_follow_counts(self):
+        """フォロー・フォロー解除(逆方向、未フォローの解除を含む)でフォロワー数・フォロー数が更新されること"""
+
+        def get_counts(user):
+            return UserModel.objects.values_list('followers_count', 'following_count').get(pk=user.pk)
+
+        other, another = UserFactory.create_batch(2)
+        self.client.force_login(self.user)
+        self.client.get(reverse('accounts:follow_user', args=[other.pk]))
+        self.client.get(reverse('accounts:follow_user', args=[other.pk]))
+        other.followed_by.add(another)
+
+        self.assertEqual(get_counts(self.user), (0, 1))
+        self.assertEqual(get_counts(other), (2, 0))
+        self.assertEqual(get_counts(another), (0, 1))
+
+        self.client.get(reverse('accounts:unfollow_user', args=[other.pk]))
+        self.client.get(reverse('accounts:unfollow_user', args=[other.pk]))
+        other.followed_by.remove(another, self.user)
+
+        self.assertEqual(get_counts(self.user), (0, 0))
+        self.assertEqual(get_counts(other), (0, 0))
+        self.assertEqual(get_counts(another), (0, 0))
+
+    def test_follow_counts_after_clear_and_save(self):
+        """フォローのclearで件数が更新され、フォロー前に読み込んだユーザの保存で件数が戻らないこと"""
+
+        def get_counts(user):
+            return UserModel.objects.values_list('followers_count', 'following_count').get(pk=user.pk)
+
+        other, another = UserFactory.create_batch(2)
+        loaded_user = UserModel.objects.get(pk=self.user.pk)
+        self.user.follows.add(other, another)
+        another.follows.add(self.user)
+
+        loaded_user.username = 'renamed'
+        loaded_user.save()
+
+        self.assertEqual(get_counts(self.user), (1, 2))
+
+        self.user.follows.clear()
+        self.user.followed_by.clear()
+
+        self.assertEqual(get_counts(self.user), (0, 0))
+        self.assertEqual(get_counts(other), (0, 0))
+        self.assertEqual(get_counts(another), (0, 0))
+
+    def test_follow_counts_after_deleting_user(self):
+        """ユーザの削除(フォローのcascade)でフォロー相手の件数が更新されること"""
+
+        other = UserFactory()
+        self.user.follows.add(other)
+        other.follows.add(self.user)
+
+        self.user.delete()
+
+        self.assertEqual(UserModel.objects.values_list('followers_count', 'following_count').get(pk=other.pk), (0, 0))
+
+    def test_number_of_queries(self):
+        """フォロワー数によらずqueryの数が一定であること"""
+
+        def get_followers():
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(self.followers_url)
+            return len(context)
+
+        for user in UserFactory.create_batch(2):
+            user.follows.add(self.user)
+            TipFactory(created_by=user, public_set='public')
+        num_queries = get_followers()
+
+        for user in UserFactory.create_batch(3):
+            user.follows.add(self.user)
+            TipFactory(created_by=user, public_set='public')
+
+        self.assertEqual(get_followers(), num_queries)
+
+    @override_settings(FOLLOWS_PAGINATE_BY=2)
+    def test_get_request_with_pagination(self):
+        """getリクエストのpagination確認"""
+
+        for user in UserFactory.create_batch(3):
+            user.follows.add(self.user)
+
+        response = self.client.get(self.followers_url)
+        page_obj = response.context['page_obj']
+
+        self.assertEqual(page_obj.paginator.num_pages, 2)
+        self.assertEqual(len(page_obj), 2)
+
+        response = self.client.get(self.followers_url, {'page': 2})
+
+        self.assertEqual(len(response.context['page_obj']), 1)
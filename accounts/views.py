@@ -7,7 +7,9 @@ from allauth.account.signals import email_confirmed
 from allauth.account.utils import (filter_users_by_email,
                                    send_email_confirmation)
 from app.models import Notification, Tip
-from app.utils import create_notification
+from app.stats import get_user_stats
+from app.tasks import enqueue_withdrawal_purge
+from app.utils import create_notification, invalidate_unread_notifications_count
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import logout
@@ -15,6 +17,9 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
 from django.core.mail import BadHeaderError, EmailMessage
+from django.core.paginator import Paginator
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.dispatch import receiver
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
@@ -29,15 +34,11 @@ from accounts.models import User
 
 class ProfileView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
-        user_data = User.objects.get(id=request.user.id)
-        tips = Tip.objects.filter(created_by=user_data)
-        private_tips_count = tips.filter(public_set=Tip.PRIVATE).count()
-        public_tips_count = tips.filter(public_set=Tip.PUBLIC).count()
+        user_data = request.user
 
         return render(request, 'accounts/profile.html', {
             'user_data': user_data,
-            'private_tips_count': private_tips_count,
-            'public_tips_count': public_tips_count,
+            'stats': get_user_stats(user_data.pk),
         })
         
         
@@ -46,12 +47,12 @@ class YourProfileView(View):
         if request.user.pk == self.kwargs.get('pk'):
             return redirect('accounts:profile')
         user_data = get_object_or_404(User, pk=self.kwargs.get('pk'))
-        tips = Tip.objects.filter(created_by=user_data)
-        public_tips_count = tips.filter(public_set=Tip.PUBLIC).count()
+        is_following = request.user.is_authenticated and request.user.follows.filter(pk=user_data.pk).exists()
         
         return render(request, 'accounts/your_profile.html', {
             'user_data': user_data,
-            'public_tips_count': public_tips_count,
+            'stats': get_user_stats(user_data.pk),
+            'is_following': is_following,
         })
         
 
@@ -124,12 +125,9 @@ class WithdrawalView(LoginRequiredMixin, View):
 
         if form.is_valid():
             private_tip_has_left = form.cleaned_data.get('private_tip_has_left')
-            # 退会ユーザのデータ削除
-            if not private_tip_has_left:
-                # privatetipを全て削除
-                Tip.objects.filter(created_by=user_data, public_set=Tip.PRIVATE).delete()
-            # notificationを全削除
-            Notification.objects.filter(to_user=user_data).delete()
+            # 退会ユーザのデータ(notification、privatetip)はjobで分割して削除
+            enqueue_withdrawal_purge(user_data, delete_private_tips=not private_tip_has_left)
+            invalidate_unread_notifications_count([user_data.pk])
             # emailaddressを削除
             EmailAddress.objects.filter(user=user_data).delete()
             # userのiconをNone、is_activateをfalseに更新
@@ -235,9 +233,8 @@ def follow_user(request, pk):
     if user.pk == pk:
         raise PermissionDenied('自身へのフォローはできません。')
     followed_user = get_object_or_404(User, pk=pk)
-    follows = user.follows.all()
     #既にフォローしていればメッセージのみ送信
-    if followed_user in follows:
+    if user.follows.filter(pk=pk).exists():
         messages.info(request, 'フォロー済みです。')
     else:
         user.follows.add(followed_user)
@@ -253,9 +250,8 @@ def unfollow_user(request, pk):
     if user.pk == pk:
         raise PermissionDenied('自身へのフォロー解除はできません。')
     followed_user = get_object_or_404(User, pk=pk)
-    follows = user.follows.all()
     #既にフォロー解除済みであればメッセージのみ送信
-    if followed_user in follows:
+    if user.follows.filter(pk=pk).exists():
         user.follows.remove(followed_user)
         messages.success(request, 'フォローを解除しました')
     else:
@@ -270,27 +266,30 @@ def follows(request, pk):
     path = request.path_info
     if 'follows' in path:
         # フォローを表示
-        follows = user.follows.all().prefetch_related('created_tip')
+        follows = user.follows.all()
         title = 'フォロー'
     else:
         # フォロワーを表示
-        follows = user.followed_by.all().prefetch_related('created_tip')
+        follows = user.followed_by.all()
         title = 'フォロワー'
 
-    latest_tip = []
-    public_tips_counts = []
-    for user in follows:
-        tips = Tip.objects.filter(public_set=Tip.PUBLIC, created_by=user).order_by('-updated_at')
-        if tips.exists():
-            latest_tip.append(tips.first())
-            public_tips_counts.append(tips.count())
-        else:
-            latest_tip.append('')
-            public_tips_counts.append(0)
+    # publicのtipの投稿数、最新のtipを1つのqueryで取得(フォロー・フォロワー数はUserの項目)
+    public_tips = Tip.objects.filter(created_by=OuterRef('pk'), public_set=Tip.PUBLIC).order_by()
+    follows = follows.annotate(
+        public_tips_count=Coalesce(Subquery(public_tips.values('created_by').annotate(c=Count('pk')).values('c')), 0),
+        latest_tip_id=Subquery(public_tips.order_by('-updated_at').values('pk')[:1]),
+    ).order_by('pk')
+
+    paginator = Paginator(follows, settings.FOLLOWS_PAGINATE_BY)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    # 表示するページのユーザの最新のtipをまとめて取得
+    latest_tips = Tip.objects.in_bulk([follow.latest_tip_id for follow in page_obj if follow.latest_tip_id])
+    for follow in page_obj:
+        follow.latest_tip = latest_tips.get(follow.latest_tip_id)
 
     return render(request, 'accounts/follow.html', {
-        'follows': follows,
-        'latest_tip': latest_tip,
-        'public_tips_counts': public_tips_counts,
+        'follows': page_obj,
+        'page_obj': page_obj,
         'title': title,
     })
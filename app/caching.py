@@ -0,0 +1,312 @@
+import hashlib
+import math
+import random
+import time
+import uuid
+from calendar import timegm
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                               quote_etag)
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.generic.detail import SingleObjectMixin
+
+from .models import Tip
+from .tasks import enqueue_cdn_purge
+from .utils import get_unread_notifications_count
+
+
+def cache_version_key(scope):
+    return f'cache_version:{scope}'
+
+
+def _new_version():
+    # cacheから消えた後に再設定しても、以前のversionと重複しない値にする
+    return int(time.time() * 1000)
+
+
+def get_version_timeout():
+    # versionを付けてcacheしたページ(古い値として使用する間も含む)より長く残す
+    return settings.PAGE_CACHE_TIMEOUT + settings.CACHE_STALE_TIMEOUT
+
+
+def scope_exists(scope):
+    """scopeのtip・ユーザが存在するか(存在しないもののversionをcacheに作成しないため)"""
+    name, _, pk = scope.partition(':')
+    if not pk:
+        return True
+    if not pk.isdigit():
+        return False
+    model = Tip if name == 'tip' else get_user_model()
+    return model.objects.filter(pk=pk).exists()
+
+
+def get_cache_version(*scopes):
+    """
+    scope(tips、tip:<pk>等)ごとのcacheのversionを連結して返す(cacheのkeyに含める)
+    versionがcacheにない場合は新しいversionを設定する(存在しないtip・ユーザの場合は設定せずに0とする)
+    """
+    keys = [cache_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for scope, key in zip(scopes, keys):
+        if key not in versions:
+            if not scope_exists(scope):
+                versions[key] = 0
+                continue
+            cache.add(key, _new_version(), get_version_timeout())
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def cache_modified_key(scope):
+    return f'cache_modified:{scope}'
+
+
+def get_cache_modified(*scopes):
+    """
+    scopeのversionを最後に上げた日時(UNIX時間)のうち最新のものを返す(Last-Modifiedに使用)
+    versionの値はincrで上げるため日時にならないので、日時は別のkeyに記録する
+    日時がcacheにない場合は現在日時を設定する(以前の変更日時が不明なため、変更されたものとして扱う)
+    """
+    keys = [cache_modified_key(scope) for scope in scopes]
+    timestamps = cache.get_many(keys)
+    for scope, key in zip(scopes, keys):
+        if key not in timestamps:
+            if not scope_exists(scope):
+                timestamps[key] = time.time()
+                continue
+            cache.add(key, time.time(), get_version_timeout())
+            timestamps[key] = cache.get(key)
+    return max(timestamps.values())
+
+
+def surrogate_key(scope):
+    """scopeのページに付けるCDNのSurrogate-Key(tips→public-list、tip:<pk>→tip-<pk>、user:<pk>→user-<pk>)"""
+    return 'public-list' if scope == 'tips' else scope.replace(':', '-')
+
+
+def bump_cache_version(*scopes):
+    """
+    scopeのversionを上げて、以前のversionのcacheを使用しないようにする(DBのcommit後に反映)
+    CDNにcacheされたscopeのページの削除も登録する
+    (versionを上げる前に削除すると、CDNが古いversionのページを再度cacheするため、versionを上げた後に登録する)
+    """
+    def bump():
+        for scope in scopes:
+            key = cache_version_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _new_version(), get_version_timeout())
+        cache.set_many({cache_modified_key(scope): time.time() for scope in scopes}, get_version_timeout())
+        enqueue_cdn_purge([surrogate_key(scope) for scope in scopes])
+
+    transaction.on_commit(bump)
+
+
+def bump_tip_cache_version(tip):
+    """tipを表示するページ(一覧、ユーザのtip一覧、詳細)のcacheのversionを上げる"""
+    bump_cache_version('tips', f'user:{tip.created_by_id}', f'tip:{tip.pk}')
+
+
+def _should_refresh_early(entry, now):
+    """
+    期限切れ前に作り直すかどうか(probabilistic early expiration)
+    期限に近いほど、作成に時間がかかるものほど高い確率で作り直す
+    """
+    return now - entry['delta'] * math.log(random.random() or 1e-12) >= entry['expires']
+
+
+def _release_lock(lock_key, token):
+    """lockが自分の取得したもの(tokenが一致する)場合のみ解放する"""
+    # lockの有効期間を過ぎて他のworkerが取得したlockは削除しない
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def get_or_compute(key, version, compute, timeout, cacheable=None):
+    """
+    keyのcacheの値を返す(ない場合、versionが異なる場合、期限切れの場合はcompute()で作成して設定)
+    同時に多数のリクエストがあってもcompute()の値をcacheするのはlockを取得した1つのworkerのみで、
+    他のworkerは古い値(versionが異なる、期限切れの値)があればそれを返す(stale-while-revalidate)
+    古い値もない場合はworkerを待機させないよう、lockの解放を待たずにcacheせずに作成する
+    cacheable(value)がFalseの値はcacheしない
+    """
+    entry = cache.get(key)
+    if entry is not None and entry['version'] == version and not _should_refresh_early(entry, time.time()):
+        return entry['value']
+
+    lock_key = f'lock:{key}'
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key, token, settings.CACHE_LOCK_TIMEOUT):
+        if entry is not None:
+            return entry['value']
+        return compute()
+
+    try:
+        start = time.time()
+        value = compute()
+        if cacheable is None or cacheable(value):
+            now = time.time()
+            # 期限切れ後もCACHE_STALE_TIMEOUT秒は古い値として使用するため残す
+            cache.set(key, {
+                'value': value, 'version': version, 'expires': now + timeout, 'delta': now - start,
+            }, timeout + settings.CACHE_STALE_TIMEOUT)
+        return value
+    finally:
+        _release_lock(lock_key, token)
+
+
+class CachePageMixin:
+    """
+    未ログインユーザへのGETのレスポンスを、get_cache_scopes()のscopeのversionを付けてcacheする
+    scopeのversionはtip等の変更時にapp/signals.pyで上げる
+    versionが上がった直後、期限切れの直後もレスポンスを作成するのは1つのworkerのみ(get_or_compute)
+    cacheしたレスポンスはCDNでもcacheできるよう、Cache-ControlとscopeのSurrogate-Keyを付ける
+    (CDNではsessionidのcookieがあるリクエストはcacheを使用しない設定にすること)
+    viewの後にmiddlewareが設定するcookieはPageCacheCookieMiddlewareで判定する
+    """
+
+    def get_cache_scopes(self):
+        raise NotImplementedError
+
+    def get_page_cache_key(self):
+        url = hashlib.md5(self.request.build_absolute_uri().encode()).hexdigest()
+        return f'page:{url}'
+
+    def dispatch(self, request, *args, **kwargs):
+        # ログインユーザのページ、メッセージを表示するページはcacheしない
+        if request.method != 'GET' or request.user.is_authenticated or len(get_messages(request)):
+            response = super().dispatch(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            return response
+
+        scopes = self.get_cache_scopes()
+        version = get_cache_version(*scopes)
+        key = self.get_page_cache_key()
+        rendered = False
+
+        def render():
+            nonlocal rendered
+            rendered = True
+            response = super(CachePageMixin, self).dispatch(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response.render()
+            response.cache_version = version
+            return response
+
+        def cacheable(response):
+            return response.status_code == 200 and not response.streaming and not response.cookies
+
+        response = get_or_compute(key, version, render, settings.PAGE_CACHE_TIMEOUT, cacheable=cacheable)
+        # 古いversionのレスポンス(作り直し中に返したもの)、cacheしないレスポンスはCDNでcacheしない
+        if cacheable(response) and getattr(response, 'cache_version', None) == version:
+            patch_cache_control(response, public=True, max_age=0, s_maxage=settings.CDN_CACHE_TIMEOUT)
+            response['Surrogate-Key'] = ' '.join(surrogate_key(scope) for scope in scopes)
+            # middlewareがcookieを設定した場合に削除するcacheのkey(PageCacheCookieMiddleware)
+            if rendered:
+                response.page_cache_key = key
+        else:
+            patch_cache_control(response, private=True)
+        return response
+
+
+class PageCacheCookieMiddleware:
+    """
+    CachePageMixinでCDNにcacheするとしたレスポンスに、viewの後でmiddleware(session、csrf等)がcookieを設定した場合は
+    CDNでcacheしないようにし、作成時にcacheしたページも削除する(cookieを設定したリクエスト用のページのため)
+    ※他のmiddlewareが設定したcookieを判定するため、MIDDLEWAREの先頭に追加すること
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.cookies and response.has_header('Surrogate-Key'):
+            del response['Surrogate-Key']
+            del response['Cache-Control']
+            patch_cache_control(response, private=True)
+            page_cache_key = getattr(response, 'page_cache_key', None)
+            if page_cache_key is not None:
+                cache.delete(page_cache_key)
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    GETのレスポンスにETag(未ログインユーザにはLast-Modifiedも)を付け、
+    If-None-Match・If-Modified-Sinceで変更がない場合はテンプレートを描画せずに304を返す
+    (表示できないページに304を返さないよう、objectの取得・権限の確認後、またはcacheしたレスポンスで判定する)
+    ETagはget_cache_scopes()のscopeのversionとユーザ(ログインユーザは未読のお知らせ件数も)から作成する
+    Last-Modifiedはget_last_modified()の日時とscopeのversionを上げた日時のうち最新のもの
+    """
+
+    def get_etag_parts(self):
+        return [get_cache_version(*self.get_cache_scopes())]
+
+    def get_last_modified(self):
+        return None
+
+    def get_etag(self):
+        parts = self.get_etag_parts()
+        user = self.request.user
+        if user.is_authenticated:
+            parts += [user.pk, get_unread_notifications_count(user)]
+        return quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+    def get_last_modified_timestamp(self):
+        # ログインユーザのページはtip以外(お知らせ件数等)でも変わるため、ETagのみで判定
+        if self.request.user.is_authenticated:
+            return None
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return None
+        # コメントの削除、ユーザ名の変更等は日時に残らないため、scopeのversionを上げた日時も含める
+        return max(timegm(last_modified.utctimetuple()), int(get_cache_modified(*self.get_cache_scopes())))
+
+    def dispatch(self, request, *args, **kwargs):
+        self.etag = None
+        # メッセージを表示するページは304にしない(メッセージが表示されなくなるため)
+        if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+            return super().dispatch(request, *args, **kwargs)
+
+        self.etag = self.get_etag()
+        response = super().dispatch(request, *args, **kwargs)
+        # CachePageMixinでcacheしたレスポンス(表示可能なことを確認して作成したもの)のETag・Last-Modifiedで判定
+        if response.status_code == 200 and response.has_header('ETag'):
+            last_modified = parse_http_date_safe(response.get('Last-Modified', ''))
+            return get_conditional_response(
+                request, etag=response['ETag'], last_modified=last_modified, response=response,
+            ) or response
+        return response
+
+    def get(self, request, *args, **kwargs):
+        # 304はobjectの取得・表示可否の確認(get_object)の後に判定する(非公開・削除済みのtipに304を返さない)
+        if isinstance(self, SingleObjectMixin):
+            self.object = self.get_object()
+        if self.etag is not None:
+            # If-None-Matchがある場合はIf-Modified-Sinceは使用されないため、Last-Modifiedは取得しない
+            last_modified = None
+            if 'HTTP_IF_MODIFIED_SINCE' in request.META and 'HTTP_IF_NONE_MATCH' not in request.META:
+                last_modified = self.get_last_modified_timestamp()
+            response = get_conditional_response(request, etag=self.etag, last_modified=last_modified)
+            if response is not None:
+                return response
+        if isinstance(self, SingleObjectMixin):
+            return self.render_to_response(self.get_context_data(object=self.object))
+        return super().get(request, *args, **kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        # 描画時のETagを付ける(CachePageMixinでcacheしたレスポンスは作成時のversionのETagになる)
+        response = super().render_to_response(context, **response_kwargs)
+        if self.etag is not None:
+            response['ETag'] = self.etag
+            last_modified = self.get_last_modified_timestamp()
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,66 @@
+import time
+
+import boto3
+from django.conf import settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+# Surrogate-Keyを付けるページ(tip詳細、一覧、ユーザのtip一覧)のパス
+PAGE_PATHS = ['/tip_detail/*', '/tip_public_list/*', '/usertip/*']
+
+
+class CloudFrontPurgeBackend:
+    """
+    CloudFrontのcacheを削除するbackend
+    CloudFrontはSurrogate-Keyでの削除に対応していないため、Surrogate-Keyをページのパスに変換して無効化する
+    """
+
+    def __init__(self):
+        self.client = boto3.client('cloudfront')
+
+    def get_paths(self, keys):
+        if 'users' in keys:
+            # usersはSurrogate-Keyを付ける全てのページに付けているため、それらのページを全て無効化
+            # (static、mediaのファイルは無効化しないよう、/*にはしない)
+            return PAGE_PATHS
+        paths = set()
+        for key in keys:
+            name, _, pk = key.partition('-')
+            if key == 'public-list':
+                paths.add(f'{reverse("app:tip_public_list")}*')
+            elif name == 'tip' and pk:
+                paths.add(f'{reverse("app:tip_detail", args=[pk])}*')
+            elif name == 'user' and pk:
+                paths.add(f'{reverse("app:usertip", args=[pk])}*')
+            else:
+                raise ValueError(f'Unknown surrogate key: {key}')
+        # 同時に実行できるワイルドカードのパスの数が限られるため、多い場合はページ全体を無効化
+        if len(paths) > settings.CDN_PURGE_MAX_PATHS:
+            return PAGE_PATHS
+        return sorted(paths)
+
+    def purge(self, keys):
+        paths = self.get_paths(keys)
+        self.client.create_invalidation(
+            DistributionId=settings.AWS_CLOUDFRONT_DISTRIBUTION_ID,
+            InvalidationBatch={
+                'Paths': {'Quantity': len(paths), 'Items': paths},
+                'CallerReference': f'{time.time()}:{" ".join(keys)}'[:128],
+            },
+        )
+
+
+class LocalPurgeBackend:
+    """
+    CDNのcacheを削除せず、purgedに保存するbackend(開発、テスト用)
+    削除したSurrogate-KeyはLocalPurgeBackend.purgedで確認する(削除1回ごとのSurrogate-Keyのlist)
+    """
+    purged = []
+
+    def purge(self, keys):
+        self.purged.append(list(keys))
+
+
+def get_purge_backend():
+    """settings.CDN_PURGE_BACKENDのbackendを返す"""
+    return import_string(settings.CDN_PURGE_BACKEND)()
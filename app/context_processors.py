@@ -1,6 +1,9 @@
+from functools import partial
+
 from django.conf import settings
 
 from .models import Tip
+from .utils import get_unread_notifications_count
 
 
 def tips_count(request):
@@ -23,6 +26,7 @@ def tips_count(request):
 
 def notifications_count(request):
     if request.user.is_authenticated:
-        return {'notifications_count': request.user.notification_to.filter(is_read=False).count}
+        # cacheの未読件数を使用(テンプレートで表示する場合のみ取得)
+        return {'notifications_count': partial(get_unread_notifications_count, request.user)}
     else:
         return {'notifications_count': 0}
@@ -5,7 +5,7 @@ from django.db import transaction
 from django.forms.models import inlineformset_factory
 
 from .models import Code, Comment, Notification, Tip
-from .utils import create_notification
+from .tasks import notify_many
 
 
 class ModelFormWithFormSetMixin:
@@ -87,17 +87,16 @@ class CommentForm(forms.ModelForm):
             comment = self.save(commit=False)
             comment.tip = tip
             comment.created_by = request.user
-            comments = Comment.objects.filter(tip=tip).order_by('-no')
-            if comments.exists():
-                comment.no = comments.first().no + 1
-            else:
-                comment.no = 1
-            comment.save()
-            for to_user_id in (to_users_id or []):
-                to_user = get_user_model().objects.get(id=to_user_id)
-                comment.to_users.add(to_user)
-                create_notification(request, to_user=to_user, category=Notification.COMMENT, tip=tip)
+            comment.no = tip.next_comment_no()
             comment.save()
+            if to_users_id:
+                # 宛先の登録とお知らせの作成はまとめて行う(お知らせは有効なユーザにのみ作成する)
+                to_users = get_user_model().objects.filter(pk__in=to_users_id)
+                Comment.to_users.through.objects.bulk_create([
+                    Comment.to_users.through(comment=comment, user_id=user_id)
+                    for user_id in to_users.values_list('pk', flat=True)
+                ])
+                notify_many(to_users, Notification.COMMENT, tip=tip, created_by=request.user)
         return comment
     
     # コメントチェック
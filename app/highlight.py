@@ -0,0 +1,34 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import TextLexer, get_lexer_for_filename
+from pygments.util import ClassNotFound
+
+# 詳細ページの表示用(cssはapp/static/app/css/highlight.css)
+FORMATTER = HtmlFormatter(cssclass='highlight', linenos='table', wrapcode=True)
+
+
+def get_lexer(filename):
+    """ファイル名の拡張子でlexerを選択する(不明な場合はテキスト)"""
+    try:
+        return get_lexer_for_filename(filename, stripnl=False)
+    except ClassNotFound:
+        return TextLexer(stripnl=False)
+
+
+def highlight_code(filename, content):
+    """
+    コードをシンタックスハイライトしたHTMLを返す
+    lexerとコードの内容のhashをkeyにcacheし、同じ内容は再計算しない
+    """
+    lexer = get_lexer(filename)
+    digest = hashlib.sha256(f'{lexer.name}\0{content}'.encode()).hexdigest()
+    key = f'highlight:{digest}'
+    html = cache.get(key)
+    if html is None:
+        html = highlight(content, lexer, FORMATTER)
+        cache.set(key, html, settings.HIGHLIGHT_CACHE_TIMEOUT)
+    return html
@@ -0,0 +1,93 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# kindごとの処理(app/tasks.pyで登録)
+_handlers = {}
+
+
+def register(kind, atomic=True):
+    """
+    jobの処理を登録するdecorator(処理はpayloadを引数に取る)
+    処理はトランザクション内で実行する(外部APIの呼び出し等、lockを保持したくない処理はatomic=Falseにする)
+    """
+    def decorator(func):
+        func.atomic = atomic
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, payload=None, run_at=None):
+    """
+    jobを登録する
+    呼び出し元のトランザクション内で登録するため、commitされた場合のみworkerで処理される
+    """
+    return Job.objects.create(kind=kind, payload=payload or {}, run_at=run_at or timezone.now())
+
+
+def get_retry_delay(attempts):
+    """再試行までの待機時間(指数バックオフ、上限あり)"""
+    seconds = settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.JOB_RETRY_BACKOFF_MAX))
+
+
+def claim_jobs(limit, kinds=None):
+    """
+    処理予定日時を過ぎたjobを最大limit件取得し、処理中に更新して返す
+    処理中のjobは処理期限(JOB_LEASE_TIMEOUT)を過ぎると再度取得される(workerが異常終了した場合の再実行)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = Job.objects.filter(Q(status=Job.PENDING) | Q(status=Job.RUNNING), run_at__lte=now).order_by('run_at', 'pk')
+        if kinds:
+            jobs = jobs.filter(kind__in=kinds)
+        # 複数のworkerで同じjobを取得しないよう、他のworkerがlock中のjobは飛ばす
+        if connection.features.has_select_for_update_skip_locked:
+            jobs = jobs.select_for_update(skip_locked=True)
+        jobs = list(jobs[:limit])
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING,
+            run_at=now + timedelta(seconds=settings.JOB_LEASE_TIMEOUT),
+            updated_at=now,
+        )
+    return jobs
+
+
+def run_job(job):
+    """jobを処理し、結果(完了、再試行待ち、失敗)を保存する"""
+    job.attempts += 1
+    try:
+        handler = _handlers[job.kind]
+        if handler.atomic:
+            with transaction.atomic():
+                handler(job.payload)
+        else:
+            handler(job.payload)
+    except Exception as e:
+        logger.exception('job error (kind=%s, pk=%s)', job.kind, job.pk)
+        job.last_error = f'{type(e).__name__}: {e}'
+        if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+            job.status = Job.FAILED
+        else:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + get_retry_delay(job.attempts)
+    else:
+        job.status = Job.DONE
+    job.save(update_fields=['status', 'attempts', 'run_at', 'last_error', 'updated_at'])
+    return job.status == Job.DONE
+
+
+def run_pending_jobs(limit=100, kinds=None):
+    """処理予定日時を過ぎたjobを処理し、(処理件数, 完了件数)を返す"""
+    jobs = claim_jobs(limit, kinds)
+    done = sum(run_job(job) for job in jobs)
+    return len(jobs), done
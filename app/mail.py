@@ -0,0 +1,135 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .jobs import get_retry_delay
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    メールを送信せずにOutgoingEmail(送信待ちのメール)に登録するbackend
+    送信はworker(send_queued_emailsコマンド)がsettings.EMAIL_OUTBOX_BACKENDで行う
+    ※添付ファイルには未対応
+    """
+
+    def send_messages(self, email_messages):
+        outgoing_emails = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            try:
+                # ヘッダの誤り(BadHeaderError等)は登録時に検出する
+                message.message()
+            except Exception:
+                if not self.fail_silently:
+                    raise
+                continue
+            outgoing_emails.append(OutgoingEmail(
+                subject=message.subject,
+                body=message.body,
+                from_email=message.from_email,
+                to=list(message.to),
+                cc=list(message.cc),
+                bcc=list(message.bcc),
+                reply_to=list(message.reply_to),
+                headers=message.extra_headers,
+                alternatives=[list(alternative) for alternative in getattr(message, 'alternatives', [])],
+            ))
+        OutgoingEmail.objects.bulk_create(outgoing_emails)
+        return len(outgoing_emails)
+
+
+def build_message(outgoing_email, connection=None):
+    """OutgoingEmailからメールを作成する"""
+    return EmailMultiAlternatives(
+        subject=outgoing_email.subject,
+        body=outgoing_email.body,
+        from_email=outgoing_email.from_email,
+        to=outgoing_email.to,
+        cc=outgoing_email.cc,
+        bcc=outgoing_email.bcc,
+        reply_to=outgoing_email.reply_to,
+        headers=outgoing_email.headers,
+        alternatives=[tuple(alternative) for alternative in outgoing_email.alternatives],
+        connection=connection,
+    )
+
+
+def claim_emails(limit):
+    """
+    送信予定日時を過ぎたメールを最大limit件取得し、送信中に更新して返す
+    送信中のメールは処理期限(JOB_LEASE_TIMEOUT)を過ぎると再度取得される(workerが異常終了した場合の再送信)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = OutgoingEmail.objects.filter(
+            Q(status=OutgoingEmail.PENDING) | Q(status=OutgoingEmail.SENDING), run_at__lte=now
+        ).order_by('run_at', 'pk')
+        # 複数のworkerで同じメールを取得しないよう、他のworkerがlock中のメールは飛ばす
+        if connection.features.has_select_for_update_skip_locked:
+            emails = emails.select_for_update(skip_locked=True)
+        emails = list(emails[:limit])
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            status=OutgoingEmail.SENDING,
+            run_at=now + timedelta(seconds=settings.JOB_LEASE_TIMEOUT),
+        )
+    return emails
+
+
+def set_error(email, error):
+    """送信に失敗したメールを再送信待ちにし、最大試行回数(JOB_MAX_ATTEMPTS)を超えた場合は失敗にする"""
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= settings.JOB_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.status = OutgoingEmail.PENDING
+        email.run_at = timezone.now() + get_retry_delay(email.attempts)
+
+
+def send_queued_emails(limit=100):
+    """
+    送信予定日時を過ぎたメールを1つの接続でまとめて送信し、(処理件数, 送信件数)を返す
+    送信に失敗したメールは待機後に再送信し、最大試行回数(JOB_MAX_ATTEMPTS)を超えると失敗にする
+    """
+    emails = claim_emails(limit)
+    if not emails:
+        return 0, 0
+
+    try:
+        mail_connection = get_connection(settings.EMAIL_OUTBOX_BACKEND)
+        mail_connection.open()
+    except Exception as e:
+        # 接続できない場合(SMTPサーバの停止等)は、取得した全てのメールを再送信待ち(または失敗)にする
+        logger.exception('email connection error')
+        for email in emails:
+            email.attempts += 1
+            set_error(email, e)
+            email.save(update_fields=['status', 'attempts', 'run_at', 'last_error'])
+        return len(emails), 0
+
+    sent = 0
+    try:
+        for email in emails:
+            email.attempts += 1
+            try:
+                build_message(email, connection=mail_connection).send()
+            except Exception as e:
+                logger.exception('email error (pk=%s)', email.pk)
+                set_error(email, e)
+            else:
+                email.status = OutgoingEmail.SENT
+                email.sent_at = timezone.now()
+                sent += 1
+            email.save(update_fields=['status', 'attempts', 'run_at', 'last_error', 'sent_at'])
+    finally:
+        mail_connection.close()
+    return len(emails), sent
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.highlight import highlight_code
+from app.models import Code
+
+
+class Command(BaseCommand):
+    help = 'コードをシンタックスハイライトしたHTML(highlighted)を作成する(導入時、ハイライトの方法の変更時用)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='1回に処理するコードの件数')
+        parser.add_argument('--start-pk', type=int, default=0, help='処理を開始するコードのpk(中断した処理の再開用)')
+        parser.add_argument('--sleep', type=float, default=0, help='batchごとの待機秒数(DBの負荷軽減用)')
+        parser.add_argument('--all', action='store_true', help='作成済みのコードも作り直す')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = options['start_pk']
+        count = 0
+
+        codes = Code.objects.all() if options['all'] else Code.objects.filter(highlighted='')
+        # コードをpkの昇順にbatch_sizeずつ処理(post_saveを発生させないようにbulk_updateで更新)
+        while True:
+            batch = list(codes.filter(pk__gt=last_pk).order_by('pk').only('pk', 'filename', 'content')[:batch_size])
+            if not batch:
+                break
+            for code in batch:
+                code.highlighted = highlight_code(code.filename, code.content)
+            with transaction.atomic():
+                Code.objects.bulk_update(batch, ['highlighted'])
+            last_pk = batch[-1].pk
+            count += len(batch)
+            self.stdout.write(f'{count}件処理しました。(last_pk={last_pk})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'コードのハイライトの作成が完了しました。({count}件)'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import Tip
+from app.rendering import render_description
+
+
+class Command(BaseCommand):
+    help = 'tipの説明を表示用にしたHTML(description_html)を作成する(導入時、表示方法の変更時用)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='1回に処理するtipの件数')
+        parser.add_argument('--start-pk', type=int, default=0, help='処理を開始するtipのpk(中断した処理の再開用)')
+        parser.add_argument('--sleep', type=float, default=0, help='batchごとの待機秒数(DBの負荷軽減用)')
+        parser.add_argument('--all', action='store_true', help='作成済みのtipも作り直す')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = options['start_pk']
+        count = 0
+
+        tips = Tip.objects.all() if options['all'] else Tip.objects.filter(description_html='')
+        # tipをpkの昇順にbatch_sizeずつ処理(updated_atを変更しないようにbulk_updateで更新)
+        while True:
+            batch = list(tips.filter(pk__gt=last_pk).order_by('pk').only('pk', 'description')[:batch_size])
+            if not batch:
+                break
+            for tip in batch:
+                tip.description_html = render_description(tip.description)
+            with transaction.atomic():
+                Tip.objects.bulk_update(batch, ['description_html'])
+            last_pk = batch[-1].pk
+            count += len(batch)
+            self.stdout.write(f'{count}件処理しました。(last_pk={last_pk})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'説明のHTMLの作成が完了しました。({count}件)'))
@@ -0,0 +1,42 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.timeline import rebuild_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'フォローしているユーザの最新のtipを各ユーザのタイムラインに追加する(タイムライン導入時、不整合の修正用)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='1回に処理するユーザの件数')
+        parser.add_argument('--start-pk', type=int, default=0, help='処理を開始するユーザのpk(中断した処理の再開用)')
+        parser.add_argument('--sleep', type=float, default=0, help='batchごとの待機秒数(DBの負荷軽減用)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = options['start_pk']
+        count = 0
+
+        # フォローしているユーザをpkの昇順にbatch_sizeずつ処理
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk, follows__isnull=False).distinct()
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                for user_id in user_ids:
+                    rebuild_timeline(user_id)
+            last_pk = user_ids[-1]
+            count += len(user_ids)
+            self.stdout.write(f'{count}件処理しました。(last_pk={last_pk})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'タイムラインの作成が完了しました。({count}件)'))
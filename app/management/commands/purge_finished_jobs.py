@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import Job, OutgoingEmail
+
+
+class Command(BaseCommand):
+    help = '保存期間を過ぎた完了したjob、送信済みのメールを削除する(失敗したものは調査用に残す)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.JOB_RETENTION_DAYS, help='完了したjob、送信済みのメールの保存日数')
+        parser.add_argument('--batch-size', type=int, default=1000, help='1回に削除する件数')
+        parser.add_argument('--sleep', type=float, default=0, help='batchごとの待機秒数(DBの負荷軽減用)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        jobs = self.purge(Job.objects.filter(status=Job.DONE, updated_at__lt=cutoff), options)
+        emails = self.purge(OutgoingEmail.objects.filter(status=OutgoingEmail.SENT, sent_at__lt=cutoff), options)
+
+        self.stdout.write(self.style.SUCCESS(f'削除が完了しました。(job:{jobs}件、メール:{emails}件)'))
+
+    def purge(self, queryset, options):
+        count = 0
+        # lockを長時間保持しないよう、pkの昇順にbatch_sizeずつ別のトランザクションで削除
+        while True:
+            with transaction.atomic():
+                pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+                if not pks:
+                    break
+                queryset.model.objects.filter(pk__in=pks).delete()
+            count += len(pks)
+            self.stdout.write(f'{queryset.model._meta.db_table}: {count}件削除しました。')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return count
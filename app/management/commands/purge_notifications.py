@@ -0,0 +1,48 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import Notification
+
+
+class Command(BaseCommand):
+    help = '保存期間を過ぎた既読のお知らせを削除する(--archiveを指定した場合はgzip圧縮したJSON Lines形式のファイルに保存する)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.NOTIFICATIONS_RETENTION_DAYS, help='既読のお知らせの保存日数'
+        )
+        parser.add_argument('--archive', help='削除するお知らせを追記するファイル(.jsonl.gz)のパス')
+        parser.add_argument('--batch-size', type=int, default=1000, help='1回に削除する件数')
+        parser.add_argument('--sleep', type=float, default=0, help='batchごとの待機秒数(DBの負荷軽減用)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        notifications = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('pk')
+        last_pk = 0
+        count = 0
+
+        # lockを長時間保持しないよう、pkの昇順にbatch_sizeずつ別のトランザクションで削除
+        while True:
+            with transaction.atomic():
+                rows = list(notifications.filter(pk__gt=last_pk).values()[:options['batch_size']])
+                if not rows:
+                    break
+                if options['archive']:
+                    with gzip.open(options['archive'], 'at', encoding='utf-8') as f:
+                        f.writelines(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for row in rows)
+                Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            last_pk = rows[-1]['id']
+            count += len(rows)
+            self.stdout.write(f'{count}件削除しました。(last_pk={last_pk})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'お知らせの削除が完了しました。({count}件)'))
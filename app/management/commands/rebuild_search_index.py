@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import Tip
+from app.search import update_search_document
+
+
+class Command(BaseCommand):
+    help = '全Tipの検索用文書(search_document,search_vector)と転置インデックスを再作成する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='1回に処理するTipの件数')
+        parser.add_argument('--start-pk', type=int, default=0, help='処理を開始するTipのpk(中断した処理の再開用)')
+        parser.add_argument('--sleep', type=float, default=0, help='batchごとの待機秒数(DBの負荷軽減用)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = options['start_pk']
+        count = 0
+
+        # pkの昇順にbatch_sizeずつ処理(OFFSETを使わずにテーブル全体を走査)
+        # batchごとにcommitし、テーブル全体をロックしないようにする
+        while True:
+            tips = list(Tip.objects.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not tips:
+                break
+            with transaction.atomic():
+                for tip in tips:
+                    update_search_document(tip)
+            last_pk = tips[-1].pk
+            count += len(tips)
+            self.stdout.write(f'{count}件処理しました。(last_pk={last_pk})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'検索用文書・インデックスの再作成が完了しました。({count}件)'))
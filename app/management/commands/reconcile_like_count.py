@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from app.models import Like, Tip
+
+
+class Command(BaseCommand):
+    help = 'Tipのお気に入り数(like_count)をLikeの件数と照合し、ずれている場合は修正する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='1回に照合するTipの件数')
+        parser.add_argument('--start-pk', type=int, default=0, help='処理を開始するTipのpk(中断した処理の再開用)')
+        parser.add_argument('--sleep', type=float, default=0, help='batchごとの待機秒数(DBの負荷軽減用)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = options['start_pk']
+        count = 0
+        fixed = 0
+
+        # Likeの件数(修正時はupdate文の中で数え直し、照合後に追加・削除されたLikeも反映する)
+        actual_count = Coalesce(
+            Subquery(
+                Like.objects.filter(tip=OuterRef('pk')).order_by().values('tip').annotate(c=Count('pk')).values('c')
+            ),
+            0,
+        )
+
+        # pkの昇順にbatch_sizeずつ照合(OFFSETを使わずにテーブル全体を走査)
+        while True:
+            tips = list(
+                Tip.objects.filter(pk__gt=last_pk).order_by('pk')
+                .annotate(actual_like_count=actual_count)
+                .values_list('pk', 'like_count', 'actual_like_count')[:batch_size]
+            )
+            if not tips:
+                break
+            drifted = [pk for pk, like_count, actual_like_count in tips if like_count != actual_like_count]
+            if drifted:
+                with transaction.atomic():
+                    fixed += Tip.objects.filter(pk__in=drifted).update(like_count=actual_count)
+            last_pk = tips[-1][0]
+            count += len(tips)
+            self.stdout.write(f'{count}件照合しました。(last_pk={last_pk})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'お気に入り数の照合が完了しました。({count}件中{fixed}件を修正)'))
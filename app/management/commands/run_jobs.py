@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = '登録されたjob(Twitterへの投稿等)を処理する(--loop指定時は常駐して処理し続ける)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='1回に処理するjobの件数')
+        parser.add_argument('--kind', action='append', help='処理するjobの種類(複数指定可、未指定の場合は全て)')
+        parser.add_argument('--loop', action='store_true', help='常駐して処理し続ける')
+        parser.add_argument('--sleep', type=float, default=5, help='処理するjobがない場合の待機秒数(--loop指定時)')
+
+    def handle(self, *args, **options):
+        while True:
+            count, done = run_pending_jobs(limit=options['limit'], kinds=options['kind'])
+            if count:
+                self.stdout.write(f'{count}件処理しました。(完了:{done}件)')
+            if not options['loop']:
+                break
+            if not count:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS('jobの処理が完了しました。'))
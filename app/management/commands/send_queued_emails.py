@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.mail import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = '送信待ちのメールを送信する(--loop指定時は常駐して送信し続ける)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='1回の接続で送信するメールの件数')
+        parser.add_argument('--loop', action='store_true', help='常駐して送信し続ける')
+        parser.add_argument('--sleep', type=float, default=5, help='送信するメールがない場合の待機秒数(--loop指定時)')
+
+    def handle(self, *args, **options):
+        while True:
+            count, sent = send_queued_emails(limit=options['batch_size'])
+            if count:
+                self.stdout.write(f'{count}件処理しました。(送信:{sent}件)')
+            if not options['loop']:
+                break
+            if not count:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS('メールの送信が完了しました。'))
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.3 on 2026-10-18 13:00
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def create_search_document_trgm_index(apps, schema_editor):
+    # pg_trgmのGINインデックス(search_documentの部分一致検索用)
+    # PostgreSQL以外、またはpg_trgmが利用できない環境ではインデックスなし(全件走査)で動作する
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS tip_search_document_trgm ON tip USING gin (search_document gin_trgm_ops)')
+
+
+def drop_search_document_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS tip_search_document_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_tip_has_tweeted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tip',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tip',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_document_trgm_index, drop_search_document_trgm_index),
+    ]
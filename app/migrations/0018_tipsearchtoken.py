@@ -0,0 +1,34 @@
+# Generated by Django 3.2.3 on 2026-10-18 13:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_tip_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TipSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('positions', models.JSONField(default=list)),
+                ('tip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='app.tip')),
+            ],
+            options={
+                'db_table': 'tip_search_token',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tipsearchtoken',
+            index=models.Index(fields=['token'], name='tip_search_token_prefix', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddConstraint(
+            model_name='tipsearchtoken',
+            constraint=models.UniqueConstraint(fields=('token', 'tip'), name='unique_tip_search_token'),
+        ),
+    ]
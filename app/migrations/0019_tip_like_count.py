@@ -0,0 +1,35 @@
+# Generated by Django 3.2.3 on 2026-10-18 13:04
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def set_like_count(apps, schema_editor):
+    # 既存のtipのお気に入り数をLikeの件数で設定
+    Like = apps.get_model('app', 'Like')
+    Tip = apps.get_model('app', 'Tip')
+    Tip.objects.update(like_count=Coalesce(
+        Subquery(Like.objects.filter(tip=OuterRef('pk')).order_by().values('tip').annotate(c=Count('pk')).values('c')),
+        0,
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_tipsearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tip',
+            name='like_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(set_like_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tip',
+            index=models.Index(fields=['public_set', 'like_count', 'updated_at'], name='tip_public_like_count_idx'),
+        ),
+    ]
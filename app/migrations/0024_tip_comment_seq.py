@@ -0,0 +1,44 @@
+# Generated by Django 3.2.3 on 2026-10-18 13:16
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def set_comment_seq(apps, schema_editor):
+    # 既存のtipのコメントの番号の採番をコメントの最大の番号で設定し、重複した番号を振り直す
+    Comment = apps.get_model('app', 'Comment')
+    Tip = apps.get_model('app', 'Tip')
+    Tip.objects.update(comment_seq=Coalesce(
+        Subquery(Comment.objects.filter(tip=OuterRef('pk')).order_by().values('tip').annotate(m=Max('no')).values('m')),
+        0,
+    ))
+    duplicates = Comment.objects.order_by().values('tip', 'no').annotate(c=Count('pk')).filter(c__gt=1)
+    for duplicate in duplicates:
+        tip = Tip.objects.get(pk=duplicate['tip'])
+        comments = Comment.objects.filter(tip=tip, no=duplicate['no']).order_by('created_at', 'pk')[1:]
+        for comment in comments:
+            tip.comment_seq += 1
+            comment.no = tip.comment_seq
+            comment.save(update_fields=['no'])
+        tip.save(update_fields=['comment_seq'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0023_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tip',
+            name='comment_seq',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(set_comment_seq, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='comment',
+            constraint=models.UniqueConstraint(fields=('tip', 'no'), name='unique_comment_no'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.3 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0024_tip_comment_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dedup_key',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('dedup_key', ''), _negated=True), fields=('to_user', 'dedup_key'), name='unique_notification_dedup_key'),
+        ),
+    ]
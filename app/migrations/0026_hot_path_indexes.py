@@ -0,0 +1,96 @@
+# Generated by Django 3.2.3 on 2026-10-18 13:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres import operations
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    """PostgreSQLではtableをlockせずにindexを作成する(PostgreSQL以外では通常のAddIndex)"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class RemoveIndexConcurrently(operations.RemoveIndexConcurrently):
+    """PostgreSQLではtableをlockせずにindexを削除する(PostgreSQL以外では通常のRemoveIndex)"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.RemoveIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.RemoveIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class RemoveFieldIndexConcurrently(operations.NotInTransactionMixin, migrations.AlterField):
+    """
+    fieldのindex(db_index)を削除する(fieldはdb_index=Falseに変更)
+    PostgreSQLではtableをlockせずに削除する(PostgreSQL以外では通常のAlterField)
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+            return
+        self._ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        column = model._meta.get_field(self.name).column
+        for index_name in schema_editor._constraint_names(model, [column], index=True, type_=models.Index.suffix):
+            schema_editor.execute(schema_editor._delete_index_sql(model, index_name, concurrently=True))
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLYはトランザクション内で実行できない
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0025_notification_dedup_key'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='tip',
+            index=models.Index(condition=models.Q(('public_set', 'public')), fields=['-updated_at', '-id'], name='tip_public_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tip',
+            index=models.Index(fields=['created_by', 'public_set', '-updated_at'], name='tip_created_by_public_idx'),
+        ),
+        # 以下のindexは先頭の列が同じindex(tip_created_by_public_idx等)で代替できるため削除
+        RemoveIndexConcurrently(
+            model_name='tip',
+            name='tip_created_by_updated_idx',
+        ),
+        RemoveFieldIndexConcurrently(
+            model_name='tip',
+            name='created_by',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='created_tip', to=settings.AUTH_USER_MODEL),
+        ),
+        RemoveFieldIndexConcurrently(
+            model_name='comment',
+            name='tip',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='app.tip'),
+        ),
+        RemoveFieldIndexConcurrently(
+            model_name='notification',
+            name='to_user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notification_to', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
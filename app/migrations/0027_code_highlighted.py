@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0026_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='code',
+            name='highlighted',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0027_code_highlighted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tip',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 14:19
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0028_tip_description_html'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='tipsearchtoken',
+            name='positions',
+        ),
+    ]
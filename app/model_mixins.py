@@ -0,0 +1,18 @@
+class SaveExcludedFieldsMixin:
+    """
+    全項目の保存(update_fields未指定のsave)で、SAVE_EXCLUDED_FIELDSの項目を保存しないmixin
+    F式・updateで更新する項目(カウンタ等)を、読み込み後に更新された値から読み込み時の値に戻さないようにする
+    ※保存済みのインスタンスはupdate_fieldsを指定して保存するため、読み込み後に他の処理で削除された行は
+      (通常のsaveのように)作成し直さず、DatabaseError(Save with update_fields did not affect any rows.)になる
+    """
+    SAVE_EXCLUDED_FIELDS = set()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SAVE_EXCLUDED_FIELDS
+                and field.attname not in deferred_fields
+            ]
+        super().save(*args, **kwargs)
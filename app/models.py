@@ -1,10 +1,16 @@
 import uuid
 
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import F, Q
 from django.urls import reverse
+from django.utils import timezone
 from taggit.managers import TaggableManager
 
+from .highlight import highlight_code
+from .model_mixins import SaveExcludedFieldsMixin
+from .rendering import render_description
 from .validators import FileSizeValidator
 
 
@@ -13,7 +19,7 @@ def _tip_uploadfile_upload_to(instance, filename):
 
 
 
-class Tip(models.Model):
+class Tip(SaveExcludedFieldsMixin, models.Model):
     PRIVATE = 'private'
     PUBLIC = 'public'
     
@@ -24,34 +30,84 @@ class Tip(models.Model):
 
     title = models.CharField(max_length=50)
     description = models.TextField()
+    # 説明を表示用にしたHTML(説明の変更時に作成、既存のtipはbackfill_description_htmlで作成)
+    description_html = models.TextField(blank=True, editable=False)
     tags = TaggableManager()
     tweet = models.CharField(max_length=100, blank=True)
     has_tweeted = models.BooleanField(default=False)
-    created_by = models.ForeignKey(get_user_model(), related_name='created_tip', on_delete=models.CASCADE)
+    # indexはtip_created_by_public_idxで代替
+    created_by = models.ForeignKey(get_user_model(), related_name='created_tip', on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     public_set = models.CharField(max_length=20, choices=PUBLIC_SET_CHOICES, default=PRIVATE)
+    # お気に入り数(Likeの登録・削除時に更新)
+    like_count = models.IntegerField(default=0, editable=False)
+    # 最後に採番したコメントの番号
+    comment_seq = models.IntegerField(default=0, editable=False)
+    # 検索用(title,description,tags,codesを正規化して連結した文書とその全文検索用ベクトル)
+    search_document = models.TextField(blank=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     
 
     class Meta:
         db_table = 'tip'
         ordering = ('-updated_at',)
+        indexes = [
+            # お気に入り数順の一覧表示用
+            models.Index(fields=['public_set', 'like_count', 'updated_at'], name='tip_public_like_count_idx'),
+            # 一覧(更新日順)の表示用(publicのtipのみ)
+            models.Index(
+                fields=['-updated_at', '-id'], name='tip_public_updated_idx', condition=Q(public_set='public')
+            ),
+            # ユーザごとのtip(プロフィール、フォロー一覧の件数、タイムラインのフォロワーが多いユーザ分)の表示用
+            models.Index(fields=['created_by', 'public_set', '-updated_at'], name='tip_created_by_public_idx'),
+        ]
+
 
+    # F式・updateで更新する項目(全項目の保存の対象外)
+    SAVE_EXCLUDED_FIELDS = {'like_count', 'comment_seq', 'has_tweeted'}
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 説明が変更された場合のみdescription_htmlを作り直すため、読み込んだ時の説明を保持
+        instance._loaded_description = instance.__dict__.get('description')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self.description_html or self.description != getattr(self, '_loaded_description', None):
+            self.description_html = render_description(self.description)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'description_html'}
+        super().save(*args, **kwargs)
+        self._loaded_description = self.description
     
     def get_absolute_url(self):
         return reverse('app:tip_detail', kwargs={'pk': self.pk})
 
     def is_liked_by_user(self, user):
         return Like.objects.filter(created_by=user).filter(tip=self).exists()
+
+    def next_comment_no(self):
+        """
+        コメントの番号を採番して返す(トランザクション内で呼び出すこと)
+        UPDATEでtipの行をlockするため、同時に採番しても番号は重複しない
+        """
+        Tip.objects.filter(pk=self.pk).update(comment_seq=F('comment_seq') + 1)
+        self.comment_seq = Tip.objects.values_list('comment_seq', flat=True).get(pk=self.pk)
+        return self.comment_seq
     
 
 class Code(models.Model):
     tip = models.ForeignKey(Tip, related_name='codes', on_delete=models.CASCADE)
     filename = models.CharField(max_length=30, blank=True)
     content = models.TextField()
+    # シンタックスハイライトしたHTML(保存時に作成)
+    highlighted = models.TextField(blank=True, editable=False)
 
     class Meta:
         db_table = 'code'
@@ -60,13 +116,37 @@ class Code(models.Model):
     def __str__(self):
         return f'{self.tip} - {self.filename}'
 
+    def save(self, *args, **kwargs):
+        self.highlighted = highlight_code(self.filename, self.content)
+        super().save(*args, **kwargs)
+
         
     def get_absolute_url(self):
         return reverse('app:tip_detail', kwargs={'pk': self.tip.pk})
 
 
+class TipSearchToken(models.Model):
+    """検索用の転置インデックス(token→tip)"""
+    token = models.CharField(max_length=64)
+    tip = models.ForeignKey(Tip, related_name='search_tokens', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'tip_search_token'
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'tip'], name='unique_tip_search_token'),
+        ]
+        indexes = [
+            # tokenの前方一致検索用(PostgreSQLではLIKE 'xxx%'にインデックスを使用するためpattern_opsを指定)
+            models.Index(fields=['token'], name='tip_search_token_prefix', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def __str__(self):
+        return f'{self.token} - {self.tip}'
+
+
 class Comment(models.Model):
-    tip = models.ForeignKey(Tip, related_name='comments', on_delete=models.CASCADE)
+    # indexはunique_comment_noで代替
+    tip = models.ForeignKey(Tip, related_name='comments', on_delete=models.CASCADE, db_index=False)
     no = models.IntegerField(default=0)
     to_users = models.ManyToManyField(get_user_model(), related_name='comment_to', blank=True)
     text = models.TextField()
@@ -76,6 +156,9 @@ class Comment(models.Model):
     class Meta:
         db_table = 'comment'
         ordering = ('tip', 'no')
+        constraints = [
+            models.UniqueConstraint(fields=['tip', 'no'], name='unique_comment_no'),
+        ]
         
     def __str__(self):
         return f'{self.tip} - {self.no}'
@@ -119,20 +202,133 @@ class Notification(models.Model):
         # (MESSAGE, 'メッセージ'),
     )
 
-    to_user = models.ForeignKey(get_user_model(), related_name='notification_to', on_delete=models.CASCADE)
+    # indexはnotification_inbox_idxで代替
+    to_user = models.ForeignKey(get_user_model(), related_name='notification_to', on_delete=models.CASCADE, db_index=False)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     tip = models.ForeignKey(Tip, related_name='notifications', on_delete=models.CASCADE, blank=True, null=True)
     content = models.CharField(max_length=100, blank=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(get_user_model(), related_name='created_notification', on_delete=models.CASCADE, blank=True, null=True)
+    # 同じお知らせを重複して作成しないためのkey(ユーザごとに一意、空の場合は重複を確認しない)
+    dedup_key = models.CharField(max_length=100, blank=True, editable=False)
 
     class Meta:
         db_table = 'notification'
         ordering =('to_user', 'is_read', '-created_at')
+        indexes = [
+            # お知らせ一覧(全て)のページング用
+            models.Index(fields=['to_user', '-created_at', '-id'], name='notification_inbox_idx'),
+            # お知らせ一覧(未確認のみ)のページング用
+            models.Index(
+                fields=['to_user', '-created_at', '-id'], name='notification_unread_idx', condition=Q(is_read=False)
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['to_user', 'dedup_key'], name='unique_notification_dedup_key', condition=~Q(dedup_key='')
+            ),
+        ]
         
     def __str__(self):
         return f'{self.to_user} - {self.created_at}'
 
     def get_absolute_url(self):
         return reverse('app:notifications')
+
+
+class TimelineEntry(models.Model):
+    """ユーザのタイムライン(フォローしているユーザのpublicのtip)の項目"""
+    user = models.ForeignKey(get_user_model(), related_name='timeline_entries', on_delete=models.CASCADE)
+    tip = models.ForeignKey(Tip, related_name='timeline_entries', on_delete=models.CASCADE)
+    # タイムラインの並び順(tipのupdated_at)
+    tip_updated_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'timeline_entry'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tip'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-tip_updated_at', '-tip'], name='timeline_entry_user_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.tip}'
+
+
+class Job(models.Model):
+    """非同期処理(Twitterへの投稿等)のキュー(workerのrun_jobsコマンドで処理する)"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, '未処理'),
+        (RUNNING, '処理中'),
+        (DONE, '完了'),
+        (FAILED, '失敗'),
+    )
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    # 処理予定日時(再試行の待機、処理中の場合はworkerの処理期限)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'job'
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} - {self.status}'
+
+
+class OutgoingEmail(models.Model):
+    """送信待ちのメール(workerのsend_queued_emailsコマンドで送信する)"""
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, '未送信'),
+        (SENDING, '送信中'),
+        (SENT, '送信済'),
+        (FAILED, '失敗'),
+    )
+
+    subject = models.CharField(max_length=998)
+    body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list, blank=True)
+    cc = models.JSONField(default=list, blank=True)
+    bcc = models.JSONField(default=list, blank=True)
+    reply_to = models.JSONField(default=list, blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+    # html等の代替の本文([content, mimetype]のリスト)
+    alternatives = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    # 送信予定日時(再送信の待機、送信中の場合はworkerの処理期限)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'outgoing_email'
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='outgoing_email_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} - {self.status}'
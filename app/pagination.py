@@ -0,0 +1,167 @@
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPaginator:
+    """
+    cursor(keyset)方式のpaginator
+    querysetの並び順のキー(最後にpkを追加)の値で前後のページを抽出するため、
+    OFFSETによる読み飛ばし、件数のCOUNTを行わない(ページが深くても処理時間が変わらない)
+    """
+    salt = 'app.pagination.CursorPaginator'
+
+    def __init__(self, queryset, per_page):
+        self.per_page = int(per_page)
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+        self.ordering = self._get_ordering(queryset)
+        self.queryset = queryset.order_by(*self.ordering)
+        # 件数は数えない(テンプレートでは表示しない)
+        self.count = None
+
+    def _get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by or self.model._meta.ordering)
+        for field in ordering:
+            if not isinstance(field, str) or '__' in field or field == '?':
+                raise ValueError(f'cursor方式のページングに対応していない並び順です。({field})')
+        # 並び順を一意にするため、pkを追加
+        if not any(field.lstrip('-') in ('pk', self.model._meta.pk.name) for field in ordering):
+            ordering.append('-pk' if ordering and ordering[-1].startswith('-') else 'pk')
+        return ordering
+
+    def _get_field(self, name):
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        if name == 'pk':
+            return self.model._meta.pk
+        return self.model._meta.get_field(name)
+
+    def encode_cursor(self, obj, direction):
+        """objの位置と方向(next,previous)を表すcursor(署名付きの文字列)を返す"""
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return signing.dumps({'o': self.ordering, 'd': direction, 'v': values}, salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        """cursorを(方向, 並び順のキーの値)に変換して返す"""
+        try:
+            data = signing.loads(cursor, salt=self.salt)
+            if data['o'] != self.ordering or data['d'] not in ('next', 'previous'):
+                raise InvalidCursor('ページの指定が正しくありません。')
+            values = [
+                self._get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, data['v'])
+            ]
+        except (signing.BadSignature, KeyError, TypeError, ValidationError):
+            raise InvalidCursor('ページの指定が正しくありません。')
+        return data['d'], values
+
+    def _keyset_filter(self, values, reverse=False):
+        """
+        並び順のキーがvaluesより後(reverse=Trueの場合は前)の行を抽出する条件を返す
+        (a, b, pk)の降順の場合: a < va or (a = va and b < vb) or (a = va and b = vb and pk < vpk)
+        """
+        condition = Q()
+        equals = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= equals & Q(**{f'{name}__{lookup}': value})
+            equals &= Q(**{name: value})
+        # 先頭のキーの範囲条件を追加(indexの範囲検索を使用させるため)
+        first = self.ordering[0]
+        lookup = 'lte' if first.startswith('-') != reverse else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & condition
+
+    def page(self, cursor=None):
+        """cursorの位置のページを返す(cursorがない場合は最初のページ)"""
+        direction, values = self.decode_cursor(cursor) if cursor else ('next', None)
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, reverse=direction == 'previous'))
+        if direction == 'previous':
+            queryset = queryset.reverse()
+
+        # 次のページの有無を判定するため、1件多く取得
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if direction == 'previous':
+            object_list.reverse()
+            return CursorPage(object_list, self, has_next=True, has_previous=has_more)
+        return CursorPage(object_list, self, has_next=has_more, has_previous=values is not None)
+
+
+class CursorPage(Sequence):
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<CursorPage>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        return self.paginator.encode_cursor(self.object_list[-1], 'next') if self.has_next() else None
+
+    @property
+    def previous_cursor(self):
+        return self.paginator.encode_cursor(self.object_list[0], 'previous') if self.has_previous() else None
+
+
+class CursorPaginationMixin:
+    """
+    ListViewのページングをcursor方式にするmixin
+    settings.TIP_LIST_CURSOR_PAGINATIONがTrueの場合のみ有効(Falseの場合はページ番号方式)
+    """
+    cursor_kwarg = 'cursor'
+
+    def use_cursor_pagination(self):
+        return settings.TIP_LIST_CURSOR_PAGINATION
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = self.use_cursor_pagination()
+        return context
@@ -0,0 +1,11 @@
+from django.template.defaultfilters import linebreaks_filter, urlize
+
+from .templatetags.url_target_blank import url_target_blank
+
+
+def render_description(text):
+    """
+    tipの説明を表示用のHTMLにする
+    tip_detail.htmlの description|linebreaks|urlize|url_target_blank と同じ結果になる
+    """
+    return url_target_blank(urlize(linebreaks_filter(text, autoescape=True), autoescape=True))
@@ -0,0 +1,91 @@
+import unicodedata
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection, transaction
+from django.db.models import F, Q, Value
+
+from .models import Code, Tip, TipSearchToken
+from .tokenizers import get_tokenizer
+
+# 全文検索のconfig(日本語を含むため言語処理はせず、単語分割のみ行う)
+SEARCH_CONFIG = 'simple'
+# 転置インデックスで絞り込む際に使用するtokenの最大数(以降はsearch_documentの部分一致で判定)
+MAX_QUERY_TOKENS = 8
+
+
+def normalize_text(text):
+    """検索用に文字列を正規化(全角半角を統一して小文字化)"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def build_search_document(tip):
+    """
+    tipの検索用文書を作成する
+    title,description,tags,codes(filename,content)をそれぞれ正規化して返す
+    """
+    tags = list(tip.tags.values_list('name', flat=True))
+    codes = list(Code.objects.filter(tip=tip).values_list('filename', 'content'))
+
+    return {
+        'title': normalize_text(tip.title),
+        'description': normalize_text(tip.description),
+        'tags': normalize_text(' '.join(tags)),
+        'codes': normalize_text('\n'.join(f'{filename}\n{content}' for filename, content in codes)),
+    }
+
+
+def update_search_document(tip):
+    """tipの検索用文書(search_document,search_vector)を更新する"""
+    with transaction.atomic():
+        # 同じtipの同時更新でインデックスの削除・作成が交差しないよう(unique制約の違反)、tipの行をlockしてから作成
+        if not Tip.objects.select_for_update().filter(pk=tip.pk).exists():
+            return
+        document = build_search_document(tip)
+        fields = {
+            'search_document': '\n'.join(document.values()),
+        }
+        # search_vectorはPostgreSQLのみ(ランキングに使用)
+        if connection.vendor == 'postgresql':
+            fields['search_vector'] = (
+                SearchVector(Value(document['title']), weight='A', config=SEARCH_CONFIG)
+                + SearchVector(Value(document['tags']), weight='B', config=SEARCH_CONFIG)
+                + SearchVector(Value(document['description']), weight='C', config=SEARCH_CONFIG)
+                + SearchVector(Value(document['codes']), weight='D', config=SEARCH_CONFIG)
+            )
+        # updateで更新(updated_atを更新しない、post_saveを発生させないため)
+        Tip.objects.filter(pk=tip.pk).update(**fields)
+        update_search_index(tip, document)
+
+
+def update_search_index(tip, document):
+    """tipの転置インデックス(TipSearchToken)を作り直す(tipの行をlockして呼び出すこと)"""
+    tokenizer = get_tokenizer()
+    tokens = {token for text in document.values() for token in tokenizer.tokenize(text)}
+
+    TipSearchToken.objects.filter(tip_id=tip.pk).delete()
+    TipSearchToken.objects.bulk_create(
+        [TipSearchToken(token=token, tip_id=tip.pk) for token in sorted(tokens)], batch_size=1000,
+    )
+
+
+def search_tips(queryset, query):
+    """
+    tipのquerysetを検索内容(query)で抽出する
+    転置インデックスで候補を絞り込んだ上で、search_documentの部分一致で抽出し、
+    PostgreSQLの場合はsearch_rank(関連度)を付与する
+    """
+    if settings.TIP_SEARCH_INDEX_ENABLED:
+        tokens = get_tokenizer().tokenize_query(query)
+        for token, is_prefix in tokens[:MAX_QUERY_TOKENS]:
+            lookup = Q(token__startswith=token) if is_prefix else Q(token=token)
+            queryset = queryset.filter(pk__in=TipSearchToken.objects.filter(lookup).values('tip_id'))
+
+    queryset = queryset.filter(search_document__contains=normalize_text(query))
+
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(normalize_text(query), config=SEARCH_CONFIG)
+        queryset = queryset.annotate(search_rank=SearchRank(F('search_vector'), search_query))
+
+    return queryset
@@ -0,0 +1,190 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from taggit.models import Tag
+
+from .caching import bump_cache_version, bump_tip_cache_version
+from .models import Code, Comment, Like, Notification, TimelineEntry, Tip
+from .search import update_search_document
+from .stats import delete_user_stats
+from .tasks import enqueue_timeline_fanout
+from .timeline import Follow, add_followee_tips, remove_followee_tips
+from .utils import invalidate_unread_notifications_count
+
+# 削除処理中のtipのpk(cascadeで削除されるcodeで検索用文書・インデックスを作り直さないため)
+_deleting = threading.local()
+
+
+def _deleting_tip_ids():
+    if not hasattr(_deleting, 'tip_ids'):
+        _deleting.tip_ids = set()
+    return _deleting.tip_ids
+
+
+@receiver(post_save, sender=Tip)
+def tip_saved(sender, instance, **kwargs):
+    # 検索用文書を更新
+    update_search_document(instance)
+    # 作成者の統計(tipの件数)のcacheを削除
+    delete_user_stats(instance.created_by_id)
+    # tipを表示するページのcacheを無効化
+    bump_tip_cache_version(instance)
+    # フォロワーのタイムラインへの展開(非公開に変更した場合は削除)を登録
+    if instance.public_set == Tip.PUBLIC or TimelineEntry.objects.filter(tip=instance).exists():
+        enqueue_timeline_fanout(instance)
+
+
+@receiver(pre_delete, sender=Tip)
+def tip_pre_delete(sender, instance, **kwargs):
+    _deleting_tip_ids().add(instance.pk)
+    # cascadeで削除される未読のお知らせの宛先ユーザの、未読件数のcacheを作り直す
+    to_user_ids = (
+        Notification.objects.filter(tip=instance, is_read=False)
+        .order_by().values_list('to_user_id', flat=True).distinct()
+    )
+    invalidate_unread_notifications_count(list(to_user_ids))
+
+
+@receiver(post_delete, sender=Tip)
+def tip_post_delete(sender, instance, **kwargs):
+    _deleting_tip_ids().discard(instance.pk)
+    delete_user_stats(instance.created_by_id)
+    bump_tip_cache_version(instance)
+
+
+@receiver(post_save, sender=Code)
+@receiver(post_delete, sender=Code)
+def code_changed(sender, instance, **kwargs):
+    # 検索用文書を更新(tipの削除に伴うcascadeの場合は不要)
+    if instance.tip_id in _deleting_tip_ids():
+        return
+    update_search_document(instance.tip)
+    bump_tip_cache_version(instance.tip)
+
+
+@receiver(m2m_changed, sender=Tip.tags.through)
+def tip_tags_changed(sender, instance, action, **kwargs):
+    # taggitのTaggedItemは全モデル共通のため、Tipのタグ変更のみ対象
+    if isinstance(instance, Tip) and action in ('post_add', 'post_remove', 'post_clear'):
+        update_search_document(instance)
+        bump_tip_cache_version(instance)
+
+
+def _update_tagged_tips(tip_ids):
+    for tip in Tip.objects.filter(pk__in=tip_ids):
+        update_search_document(tip)
+        bump_tip_cache_version(tip)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_pre_delete(sender, instance, **kwargs):
+    # タグの削除はTaggedItemにcascadeし、m2m_changed(post_clear等)が発生しないため、対象のtipを削除前に取得
+    instance._tagged_tip_ids = list(Tip.objects.filter(tags=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_post_delete(sender, instance, **kwargs):
+    # 削除したタグを付けていたtipの検索用文書を更新
+    _update_tagged_tips(instance.__dict__.pop('_tagged_tip_ids', []))
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    # タグ名の変更を、タグを付けているtipの検索用文書に反映
+    if not created:
+        _update_tagged_tips(Tip.objects.filter(tags=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Like)
+def like_saved(sender, instance, created, **kwargs):
+    # お気に入り数を加算(F式で更新し、同時更新でも値がずれないようにする)
+    if created:
+        Tip.objects.filter(pk=instance.tip_id).update(like_count=F('like_count') + 1)
+        # tip作成者の統計(お気に入りされた件数)のcacheを削除し、お気に入り数を表示するページのcacheを無効化
+        delete_user_stats(instance.tip.created_by_id)
+        bump_tip_cache_version(instance.tip)
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    # お気に入り数を減算(tipの削除に伴うcascadeの場合は不要)
+    if instance.tip_id in _deleting_tip_ids():
+        return
+    Tip.objects.filter(pk=instance.tip_id, like_count__gt=0).update(like_count=F('like_count') - 1)
+    delete_user_stats(instance.tip.created_by_id)
+    bump_tip_cache_version(instance.tip)
+
+
+@receiver(m2m_changed, sender=Follow)
+def follows_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('pre_remove', 'pre_clear'):
+        # 削除対象のうちフォロー済みのもの(clearの場合は全て)のみ件数に反映するため、削除前に取得
+        if reverse:
+            follows = Follow.objects.filter(to_user=instance).values_list('from_user', flat=True)
+        else:
+            follows = Follow.objects.filter(from_user=instance).values_list('to_user', flat=True)
+        if action == 'pre_remove':
+            follows = follows.filter(**{'from_user__in' if reverse else 'to_user__in': pk_set})
+        instance._removing_follow_pks = set(follows)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action in ('post_remove', 'post_clear'):
+        pk_set = instance.__dict__.pop('_removing_follow_pks', pk_set)
+    if not pk_set:
+        return
+
+    # フォロワー数・フォロー数を更新(F式で更新し、同時更新でも値がずれないようにする)
+    sign = 1 if action == 'post_add' else -1
+    instance_field, other_field = ('followers_count', 'following_count') if reverse else ('following_count', 'followers_count')
+    User = get_user_model()
+    User.objects.filter(pk=instance.pk).update(**{instance_field: F(instance_field) + sign * len(pk_set)})
+    User.objects.filter(pk__in=pk_set).update(**{other_field: F(other_field) + sign})
+
+    # フォロー・フォロー解除をタイムラインとユーザの統計(フォロワー・フォロー数)に反映
+    delete_user_stats(instance.pk, *pk_set)
+    for pk in pk_set:
+        user_id, followee_id = (pk, instance.pk) if reverse else (instance.pk, pk)
+        if action == 'post_add':
+            add_followee_tips(user_id, followee_id)
+        else:
+            remove_followee_tips(user_id, followee_id)
+
+
+@receiver(pre_delete, sender=get_user_model())
+def user_pre_delete(sender, instance, **kwargs):
+    # ユーザの削除でcascadeされるフォローはm2m_changedが発生しないため、clearでフォロー相手の件数・タイムラインに反映
+    instance.follows.clear()
+    instance.followed_by.clear()
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    # 採番を使用せずに登録されたコメントの番号を、コメントの番号の採番に反映
+    if created:
+        Tip.objects.filter(pk=instance.tip_id, comment_seq__lt=instance.no).update(comment_seq=instance.no)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # tip詳細のコメントのcacheを無効化(tipの削除に伴うcascadeの場合は不要)
+    if instance.tip_id in _deleting_tip_ids():
+        return
+    bump_cache_version(f'tip:{instance.tip_id}')
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    # ユーザのページのcacheを無効化(作成時、ログイン日時の更新のみの場合は不要)
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    scopes = [f'user:{instance.pk}']
+    # ユーザ名・アイコン等を変更した場合のみ、それらを表示する全てのページのcacheを無効化
+    if instance.__dict__.get('_display_changed', True) and (update_fields is None or set(update_fields) & set(instance.DISPLAY_FIELDS)):
+        scopes.append('users')
+    bump_cache_version(*scopes)
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Tip
+
+
+def user_stats_key(user_id):
+    return f'accounts:stats:{user_id}'
+
+
+def get_user_stats(user_id):
+    """
+    ユーザの統計(tipの件数、お気に入りされた件数、フォロワー・フォロー数)を返す
+    cacheにない場合は1回のqueryで集計してcacheに設定する(ユーザが存在しない場合はNone)
+    """
+    key = user_stats_key(user_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = get_user_model().objects.filter(pk=user_id).annotate(
+            private_tips_count=Count('created_tip', filter=Q(created_tip__public_set=Tip.PRIVATE)),
+            public_tips_count=Count('created_tip', filter=Q(created_tip__public_set=Tip.PUBLIC)),
+            liked_count=Coalesce(Sum('created_tip__like_count'), 0),
+        ).values('private_tips_count', 'public_tips_count', 'liked_count', 'followers_count', 'following_count').first()
+        if stats is None:
+            return None
+        cache.set(key, stats, settings.USER_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def delete_user_stats(*user_ids):
+    """ユーザの統計のcacheを削除する(DBのcommit後に反映)"""
+    keys = [user_stats_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
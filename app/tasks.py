@@ -0,0 +1,174 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .cdn import get_purge_backend
+from .jobs import enqueue, register
+from .models import Job, Notification, Tip
+from .timeline import fanout_tip
+from .twitter import get_twitter_client
+from .utils import bulk_create_notifications
+
+TWEET = 'tweet'
+TIMELINE_FANOUT = 'timeline_fanout'
+NOTIFY = 'notify'
+WITHDRAWAL_PURGE = 'withdrawal_purge'
+CDN_PURGE = 'cdn_purge'
+
+
+def enqueue_for_tip(kind, tip):
+    """tipに対するjobを登録する(未処理のjobが登録済みの場合は登録しない)"""
+    pending = Job.objects.filter(kind=kind, status__in=[Job.PENDING, Job.RUNNING], payload__tip_id=tip.pk)
+    if not pending.exists():
+        enqueue(kind, {'tip_id': tip.pk})
+
+
+def enqueue_tweet(tip):
+    """tipのTwitterへの投稿を登録する"""
+    enqueue_for_tip(TWEET, tip)
+
+
+def enqueue_timeline_fanout(tip):
+    """tipのフォロワーのタイムラインへの展開を登録する"""
+    enqueue_for_tip(TIMELINE_FANOUT, tip)
+
+
+@register(TWEET, atomic=False)
+def post_tweet(payload):
+    """
+    tipのヒトコトをTwitterに投稿し、投稿済みに更新する
+    Twitterの応答を待つ間tipの行をlockしないよう、トランザクション外で投稿する
+    """
+    # 投稿前に削除、非公開に変更された場合、投稿済みの場合は投稿しない
+    # 投稿済みへの更新で投稿を確保し、複数のworkerで同じtipを投稿しないようにする
+    # updateで更新(updated_atを更新しない、post_saveを発生させないため)
+    claimed = Tip.objects.filter(pk=payload['tip_id'], public_set=Tip.PUBLIC, has_tweeted=False) \
+        .exclude(tweet='').update(has_tweeted=True)
+    if not claimed:
+        return
+
+    tip = Tip.objects.get(pk=payload['tip_id'])
+    tweet_message = f'{tip.tweet} https://www.tipstock.info/tip_detail/{tip.pk}/'
+    try:
+        get_twitter_client().update_status(tweet_message)
+    except Exception:
+        # 再試行で投稿するよう未投稿に戻す
+        Tip.objects.filter(pk=tip.pk).update(has_tweeted=False)
+        raise
+
+
+@register(TIMELINE_FANOUT)
+def fanout_tip_to_timelines(payload):
+    fanout_tip(payload['tip_id'])
+
+
+def notify_many(users, category, tip=None, content='', created_by=None, dedup_key=''):
+    """
+    users(ユーザのqueryset)のうち有効なユーザへのお知らせを作成する
+    宛先はpkの順にNOTIFICATIONS_BATCH_SIZE件ずつ取得して登録し、
+    宛先がNOTIFICATIONS_ASYNC_THRESHOLDを超える場合は登録をjobでworkerに任せる
+    jobは再試行されるため、dedup_keyを指定すると同じお知らせを重複して作成しない
+    (未指定でjobで登録する場合は呼び出しごとのkeyを付け、jobの再試行で重複して作成しない)
+    """
+    max_length = Notification._meta.get_field('dedup_key').max_length
+    if len(dedup_key) > max_length:
+        raise ValueError(f'dedup_key must be at most {max_length} characters: {dedup_key!r}')
+
+    user_ids = users.filter(is_active=True).order_by('pk').values_list('pk', flat=True)
+    threshold = settings.NOTIFICATIONS_ASYNC_THRESHOLD
+    is_async = user_ids[:threshold + 1].count() > threshold
+    if is_async and not dedup_key:
+        dedup_key = f'notify:{uuid.uuid4().hex}'
+    payload = {
+        'category': category,
+        'tip_id': tip.pk if tip else None,
+        'content': content,
+        'created_by_id': created_by.pk if created_by else None,
+        'dedup_key': dedup_key,
+    }
+
+    last_pk = 0
+    while True:
+        to_user_ids = list(user_ids.filter(pk__gt=last_pk)[:settings.NOTIFICATIONS_BATCH_SIZE])
+        if not to_user_ids:
+            break
+        if is_async:
+            enqueue(NOTIFY, {**payload, 'to_user_ids': to_user_ids})
+        else:
+            bulk_create_notifications(to_user_ids, **payload)
+        last_pk = to_user_ids[-1]
+
+
+@register(NOTIFY)
+def create_notifications_for_users(payload):
+    bulk_create_notifications(**payload)
+
+
+def enqueue_withdrawal_purge(user, delete_private_tips):
+    """退会したユーザのデータ(お知らせ、privateのtip)の削除を登録する"""
+    enqueue(WITHDRAWAL_PURGE, {
+        'user_id': user.pk,
+        'delete_private_tips': delete_private_tips,
+        'deleted': {'notifications': 0, 'tips': 0},
+    })
+
+
+@register(WITHDRAWAL_PURGE)
+def purge_withdrawn_user(payload):
+    """
+    退会したユーザのデータをWITHDRAWAL_PURGE_BATCH_SIZE件削除し、残りがある場合は続きのjobを登録する
+    (lockを長時間保持しないよう、1回のjobで削除する件数を制限する)
+    削除済みの件数はpayloadのdeletedに引き継ぐ(再試行時は未削除のデータのみ削除する)
+    """
+    # 再登録したユーザのデータは削除しない
+    if not get_user_model().objects.filter(pk=payload['user_id'], is_active=False).exists():
+        return
+
+    batch_size = settings.WITHDRAWAL_PURGE_BATCH_SIZE
+    deleted = dict(payload['deleted'])
+    notification_ids = list(
+        Notification.objects.filter(to_user_id=payload['user_id']).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if notification_ids:
+        Notification.objects.filter(pk__in=notification_ids).delete()
+        deleted['notifications'] += len(notification_ids)
+    elif payload['delete_private_tips']:
+        # tipの削除はcode、comment、like、notification等にcascadeする
+        tip_ids = list(
+            Tip.objects.filter(created_by_id=payload['user_id'], public_set=Tip.PRIVATE)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not tip_ids:
+            return
+        Tip.objects.filter(pk__in=tip_ids).delete()
+        deleted['tips'] += len(tip_ids)
+    else:
+        return
+    enqueue(WITHDRAWAL_PURGE, {**payload, 'deleted': deleted})
+
+
+def enqueue_cdn_purge(keys):
+    """
+    CDNのcacheの削除(Surrogate-Keyを指定)を登録する(CDN_PURGE_BACKENDが未設定の場合は登録しない)
+    CDNの削除は同時に実行できる件数が限られ、件数ごとに課金されるため、
+    CDN_PURGE_DELAY秒後に実行するjobを登録し、それまでの削除は未処理のjobにまとめる
+    """
+    if not settings.CDN_PURGE_BACKEND:
+        return
+    with transaction.atomic():
+        job = Job.objects.select_for_update().filter(kind=CDN_PURGE, status=Job.PENDING).order_by('pk').first()
+        if job is None:
+            run_at = timezone.now() + timedelta(seconds=settings.CDN_PURGE_DELAY)
+            enqueue(CDN_PURGE, {'keys': sorted(set(keys))}, run_at=run_at)
+        else:
+            job.payload = {'keys': sorted(set(job.payload['keys']) | set(keys))}
+            job.save(update_fields=['payload', 'updated_at'])
+
+
+@register(CDN_PURGE)
+def purge_cdn(payload):
+    get_purge_backend().purge(payload['keys'])
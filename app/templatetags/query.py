@@ -15,3 +15,14 @@ def get_query(value, arg):
         return ''
     else:
         return qs_arg[0]
+
+
+@register.simple_tag(takes_context=True)
+def url_replace(context, field, value):
+    # 現在のクエリの指定した引数の値を置き換えて返す(ページング時に検索条件を引き継ぐため)
+    query = context['request'].GET.copy()
+    if value is None:
+        query.pop(field, None)
+    else:
+        query[field] = value
+    return query.urlencode()
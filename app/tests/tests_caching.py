@@ -0,0 +1,263 @@
+import hashlib
+import time
+from datetime import timedelta
+from unittest import mock
+
+from accounts.tests.factories import UserFactory
+from app.caching import (cache_modified_key, cache_version_key,
+                         get_cache_modified, get_cache_version, get_or_compute)
+from app.cdn import CloudFrontPurgeBackend, LocalPurgeBackend
+from app.jobs import run_pending_jobs
+from app.models import Job
+from app.tasks import CDN_PURGE
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+
+from .factories import LikeFactory, TipFactory
+
+
+def set_cookie_middleware(get_response):
+    # viewの後でcookieを設定するmiddleware(session、csrf等)の代わり
+    def middleware(request):
+        response = get_response(request)
+        response.set_cookie('test', '1')
+        return response
+    return middleware
+
+
+@override_settings(CACHE_LOCK_TIMEOUT=30, CACHE_STALE_TIMEOUT=60)
+class TestGetOrCompute(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value='new')
+
+    def set_entry(self, version='1', expires_in=60, delta=0.5):
+        cache.set('key', {'value': 'old', 'version': version, 'expires': time.time() + expires_in, 'delta': delta})
+
+    def test_compute_and_cache(self):
+        """cacheがない場合は作成してcacheし、以降はcacheの値を返すこと"""
+
+        self.assertEqual(get_or_compute('key', '1', self.compute, 60), 'new')
+        self.assertEqual(get_or_compute('key', '1', self.compute, 60), 'new')
+
+        self.compute.assert_called_once()
+        self.assertIsNone(cache.get('lock:key'))
+
+    def test_serve_stale_while_locked(self):
+        """他のworkerが作り直し中の場合は、versionが異なる・期限切れの古い値を返すこと"""
+
+        cache.add('lock:key', 1)
+        self.set_entry(version='1')
+        self.assertEqual(get_or_compute('key', '2', self.compute, 60), 'old')
+
+        self.set_entry(version='2', expires_in=-1)
+        self.assertEqual(get_or_compute('key', '2', self.compute, 60), 'old')
+
+        self.compute.assert_not_called()
+
+    def test_refresh_stale_with_lock(self):
+        """lockを取得できた場合は作り直して新しいversionでcacheすること"""
+
+        self.set_entry(version='1')
+
+        self.assertEqual(get_or_compute('key', '2', self.compute, 60), 'new')
+        self.assertEqual(cache.get('key')['version'], '2')
+
+    def test_compute_without_stale_while_locked(self):
+        """古い値もない場合は、lockの解放を待たずにcacheせずに作成すること"""
+
+        cache.add('lock:key', 'other')
+
+        with mock.patch('app.caching.time.sleep') as sleep_mock:
+            self.assertEqual(get_or_compute('key', '1', self.compute, 60), 'new')
+        sleep_mock.assert_not_called()
+        self.compute.assert_called_once()
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.get('lock:key'), 'other')
+
+    def test_keep_lock_taken_over(self):
+        """作成中にlockの有効期間が過ぎ、他のworkerが取得したlockは削除しないこと"""
+
+        def compute():
+            # lockの期限切れ後に他のworkerが取得した状態にする
+            cache.set('lock:key', 'other')
+            return 'new'
+
+        self.assertEqual(get_or_compute('key', '1', compute, 60), 'new')
+        self.assertEqual(cache.get('lock:key'), 'other')
+
+    def test_probabilistic_early_refresh(self):
+        """期限切れ前でも、期限が近く乱数が小さい場合は作り直すこと"""
+
+        self.set_entry(expires_in=1, delta=0.5)
+
+        with mock.patch('app.caching.random.random', return_value=0.9):
+            self.assertEqual(get_or_compute('key', '1', self.compute, 60), 'old')
+        with mock.patch('app.caching.random.random', return_value=0.01):
+            self.assertEqual(get_or_compute('key', '1', self.compute, 60), 'new')
+
+    def test_not_cacheable(self):
+        """cacheableがFalseの値はcacheしないこと"""
+
+        get_or_compute('key', '1', self.compute, 60, cacheable=lambda value: False)
+
+        self.assertIsNone(cache.get('key'))
+
+
+class TestCacheVersion(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(PAGE_CACHE_TIMEOUT=600, CACHE_STALE_TIMEOUT=3600)
+    def test_version_keys_expire(self):
+        """scopeのversionと変更日時は、cacheしたページより長い有効期間で作成すること"""
+
+        tip = TipFactory()
+        with mock.patch('app.caching.cache.add', wraps=cache.add) as add_mock:
+            get_cache_version('tips', f'tip:{tip.pk}')
+            get_cache_modified('tips', f'tip:{tip.pk}')
+
+        self.assertEqual(add_mock.call_count, 4)
+        for call in add_mock.call_args_list:
+            self.assertEqual(call.args[2], 4200)
+
+    def test_no_version_for_missing_object(self):
+        """存在しないtip・ユーザのversionはcacheに作成しないこと"""
+
+        self.assertEqual(self.client.get(reverse('app:tip_detail', args=[999999])).status_code, 404)
+        self.client.get(reverse('app:usertip', args=[999999]))
+
+        self.assertEqual(get_cache_version('tip:999999', 'user:999999'), '0.0')
+        self.assertIsNone(cache.get(cache_version_key('tip:999999')))
+        self.assertIsNone(cache.get(cache_version_key('user:999999')))
+        self.assertIsNone(cache.get(cache_modified_key('tip:999999')))
+
+
+class TestCdnCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        LocalPurgeBackend.purged = []
+        self.user = UserFactory()
+        self.tip = TipFactory(created_by=self.user, public_set='public')
+
+    def test_headers_for_anonymous_user(self):
+        """未ログインユーザへのページにはCDN用のCache-ControlとSurrogate-Keyが付くこと"""
+
+        for url, keys in [
+            (reverse('app:tip_public_list'), 'public-list users'),
+            (reverse('app:tip_detail', args=[self.tip.pk]), f'tip-{self.tip.pk} users'),
+            (reverse('app:usertip', args=[self.user.pk]), f'user-{self.user.pk} users'),
+        ]:
+            for _ in range(2):
+                response = self.client.get(url)
+
+                self.assertEqual(response['Cache-Control'], 'public, max-age=0, s-maxage=600')
+                self.assertEqual(response['Surrogate-Key'], keys)
+
+    def test_headers_for_logged_in_user(self):
+        """ログインユーザへのページはCDNでcacheしないこと"""
+
+        self.client.force_login(UserFactory())
+        response = self.client.get(reverse('app:tip_detail', args=[self.tip.pk]))
+
+        self.assertEqual(response['Cache-Control'], 'private')
+        self.assertFalse(response.has_header('Surrogate-Key'))
+
+    def test_cookie_set_by_middleware(self):
+        """viewの後でmiddlewareがcookieを設定したページはCDNでcacheせず、cacheしたページも削除すること"""
+
+        url = reverse('app:tip_public_list')
+        middleware = list(settings.MIDDLEWARE)
+        middleware.insert(1, 'app.tests.tests_caching.set_cookie_middleware')
+        with override_settings(MIDDLEWARE=middleware):
+            response = self.client.get(url)
+
+        self.assertEqual(response['Cache-Control'], 'private')
+        self.assertFalse(response.has_header('Surrogate-Key'))
+        self.assertIsNone(cache.get(f'page:{hashlib.md5(b"http://testserver" + url.encode()).hexdigest()}'))
+
+    def test_stale_response_is_private(self):
+        """作り直し中に返した古いversionのページはCDNでcacheしないこと"""
+
+        url = reverse('app:tip_public_list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tip.save()
+        cache.add(f'lock:page:{hashlib.md5(b"http://testserver" + url.encode()).hexdigest()}', 1)
+        response = self.client.get(url)
+
+        self.assertEqual(response['Cache-Control'], 'private')
+        self.assertFalse(response.has_header('Surrogate-Key'))
+
+    @override_settings(CDN_PURGE_BACKEND='app.cdn.LocalPurgeBackend')
+    def test_purge_on_change(self):
+        """tipの変更でtip、作成者、一覧のSurrogate-Keyのページの削除が登録され、workerで削除されること"""
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tip.save()
+            # versionを上げる前(commit前)には登録しないこと
+            self.assertFalse(Job.objects.filter(kind=CDN_PURGE).exists())
+        # 削除はCDN_PURGE_DELAY秒後に実行すること
+        self.assertEqual(run_pending_jobs(kinds=[CDN_PURGE]), (0, 0))
+        with freeze_time(timezone.now() + timedelta(seconds=61)):
+            run_pending_jobs(kinds=[CDN_PURGE])
+
+        self.assertListEqual(LocalPurgeBackend.purged, [sorted(['public-list', f'tip-{self.tip.pk}', f'user-{self.user.pk}'])])
+
+    @override_settings(CDN_PURGE_BACKEND='app.cdn.LocalPurgeBackend')
+    def test_purge_is_batched(self):
+        """実行前に登録された削除は1つのjobにまとめ、1回で削除すること"""
+
+        other_tip = TipFactory(public_set='public')
+        liked_by = UserFactory()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tip.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            other_tip.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            LikeFactory(tip=self.tip, created_by=liked_by)
+
+        self.assertEqual(Job.objects.filter(kind=CDN_PURGE).count(), 1)
+        with freeze_time(timezone.now() + timedelta(seconds=61)):
+            run_pending_jobs(kinds=[CDN_PURGE])
+
+        self.assertListEqual(LocalPurgeBackend.purged, [sorted([
+            'public-list', f'tip-{self.tip.pk}', f'user-{self.user.pk}',
+            f'tip-{other_tip.pk}', f'user-{other_tip.created_by_id}',
+        ])])
+
+        # 実行後の削除は新しいjobで削除すること
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tip.save()
+        with freeze_time(timezone.now() + timedelta(seconds=61)):
+            run_pending_jobs(kinds=[CDN_PURGE])
+
+        self.assertEqual(len(LocalPurgeBackend.purged), 2)
+
+    def test_cloudfront_paths(self):
+        """CloudFrontではSurrogate-Keyをページのパスに変換して無効化すること"""
+
+        with mock.patch('app.cdn.boto3'):
+            backend = CloudFrontPurgeBackend()
+
+        self.assertListEqual(
+            backend.get_paths(['public-list', 'tip-1', 'user-2']),
+            ['/tip_detail/1/*', '/tip_public_list/*', '/usertip/2/*'],
+        )
+        # usersはページのパスのみ無効化し、static、mediaのファイルは無効化しないこと
+        self.assertListEqual(
+            backend.get_paths(['user-2', 'users']), ['/tip_detail/*', '/tip_public_list/*', '/usertip/*'],
+        )
+        # パスが多い場合はページ全体を無効化すること
+        self.assertListEqual(
+            backend.get_paths([f'tip-{pk}' for pk in range(6)]), ['/tip_detail/*', '/tip_public_list/*', '/usertip/*'],
+        )
+        with self.assertRaises(ValueError):
+            backend.get_paths(['unknown'])
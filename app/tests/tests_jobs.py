@@ -0,0 +1,227 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from accounts.tests.factories import UserFactory
+from app.jobs import claim_jobs, enqueue, run_pending_jobs
+from app.models import Job, Notification, OutgoingEmail, Tip
+from app.tasks import NOTIFY, TWEET, enqueue_tweet, notify_many
+from app.twitter import LocalTwitterClient
+from app.utils import get_unread_notifications_count
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+
+from .factories import TipFactory
+
+
+@override_settings(TWITTER_CLIENT='app.twitter.LocalTwitterClient', JOB_MAX_ATTEMPTS=2, JOB_RETRY_BACKOFF=60)
+class TestTweetJob(TestCase):
+
+    def setUp(self):
+        LocalTwitterClient.outbox = []
+        self.user = UserFactory()
+
+    def test_post_request_enqueues_tweet(self):
+        """public,ヒトコトありのtip登録でTwitterへの投稿が登録され、workerで投稿されること"""
+
+        form_data = {
+            'title': 'タイトル',
+            'description': '説明',
+            'tags': 'tag1',
+            'tweet': 'ツイート',
+            'public_set': 'public',
+            'codes-TOTAL_FORMS': 1,
+            'codes-INITIAL_FORMS': 0,
+            'codes-MIN_NUM_FORMS': 1,
+            'codes-MAX_NUM_FORMS': 5,
+            'codes-0-filename': 'filename.py',
+            'codes-0-content': 'a = 3',
+        }
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('app:tip_create'), form_data, follow=True)
+        tip = Tip.objects.get()
+
+        messages = [str(message) for message in response.context['messages']]
+        self.assertIn('Twitterへの投稿を受け付けました。', messages)
+        self.assertEqual(Job.objects.get(kind=TWEET).payload, {'tip_id': tip.pk})
+        self.assertFalse(tip.has_tweeted)
+        self.assertListEqual(LocalTwitterClient.outbox, [])
+
+        call_command('run_jobs', stdout=StringIO())
+        actual_tip = Tip.objects.get(pk=tip.pk)
+
+        self.assertListEqual(LocalTwitterClient.outbox, [f'ツイート https://www.tipstock.info/tip_detail/{tip.pk}/'])
+        self.assertTrue(actual_tip.has_tweeted)
+        self.assertEqual(actual_tip.updated_at, tip.updated_at)
+        self.assertEqual(Job.objects.get(kind=TWEET).status, Job.DONE)
+
+    def test_enqueue_tweet_once(self):
+        """未処理の投稿が登録済みの場合は登録されないこと"""
+
+        tip = TipFactory(created_by=self.user, public_set='public')
+        enqueue_tweet(tip)
+        enqueue_tweet(tip)
+
+        self.assertEqual(Job.objects.filter(kind=TWEET).count(), 1)
+
+    def test_tweet_outside_transaction(self):
+        """Twitterへの投稿はトランザクション外で行い、投稿前に読み込んだtipの保存で未投稿に戻らないこと"""
+
+        tip = TipFactory(created_by=self.user, public_set='public', tweet='ツイート')
+        loaded_tip = Tip.objects.get(pk=tip.pk)
+        enqueue_tweet(tip)
+        savepoint_ids = list(connection.savepoint_ids)
+
+        def update_status(status):
+            self.assertListEqual(connection.savepoint_ids, savepoint_ids)
+            self.assertTrue(Tip.objects.get(pk=tip.pk).has_tweeted)
+
+        with mock.patch.object(LocalTwitterClient, 'update_status', side_effect=update_status) as update_status_mock:
+            self.assertEqual(run_pending_jobs(kinds=[TWEET]), (1, 1))
+        update_status_mock.assert_called_once()
+
+        loaded_tip.title = '更新'
+        loaded_tip.save()
+        self.assertTrue(Tip.objects.get(pk=tip.pk).has_tweeted)
+
+    def test_skip_tweet(self):
+        """投稿前に非公開に変更、削除されたtipは投稿されないこと"""
+
+        private_tip = TipFactory(created_by=self.user, public_set='public')
+        deleted_tip = TipFactory(created_by=self.user, public_set='public')
+        enqueue_tweet(private_tip)
+        enqueue_tweet(deleted_tip)
+        Tip.objects.filter(pk=private_tip.pk).update(public_set='private')
+        deleted_tip.delete()
+
+        self.assertEqual(run_pending_jobs(kinds=[TWEET]), (2, 2))
+        self.assertListEqual(LocalTwitterClient.outbox, [])
+
+    def test_retry_with_backoff(self):
+        """投稿に失敗した場合は待機後に再試行し、最大試行回数を超えると失敗になること"""
+
+        tip = TipFactory(created_by=self.user, public_set='public')
+        enqueue_tweet(tip)
+        now = timezone.now()
+
+        with mock.patch.object(LocalTwitterClient, 'update_status', side_effect=Exception('rate limit')), \
+                self.assertLogs('app.jobs', level='ERROR'):
+            with freeze_time(now):
+                self.assertEqual(run_pending_jobs(kinds=[TWEET]), (1, 0))
+            job = Job.objects.get(kind=TWEET)
+
+            self.assertEqual(job.status, Job.PENDING)
+            self.assertEqual(job.attempts, 1)
+            self.assertEqual(job.run_at, now + timedelta(seconds=60))
+            self.assertEqual(job.last_error, 'Exception: rate limit')
+
+            # 待機中は処理されないこと
+            with freeze_time(now + timedelta(seconds=59)):
+                self.assertEqual(run_pending_jobs(kinds=[TWEET]), (0, 0))
+            with freeze_time(now + timedelta(seconds=60)):
+                self.assertEqual(run_pending_jobs(kinds=[TWEET]), (1, 0))
+
+        self.assertEqual(Job.objects.get(kind=TWEET).status, Job.FAILED)
+        self.assertFalse(Tip.objects.get(pk=tip.pk).has_tweeted)
+
+    @override_settings(JOB_LEASE_TIMEOUT=300)
+    def test_claim_expired_running_job(self):
+        """処理中のjobは処理期限を過ぎるまで再度取得されないこと"""
+
+        job = enqueue('unknown')
+        now = timezone.now()
+
+        with freeze_time(now):
+            self.assertListEqual(claim_jobs(10), [job])
+            self.assertListEqual(claim_jobs(10), [])
+        with freeze_time(now + timedelta(seconds=300)):
+            self.assertListEqual(claim_jobs(10), [job])
+
+    def test_purge_finished_jobs(self):
+        """保存期間を過ぎた完了したjob、送信済みのメールのみ削除されること"""
+
+        now = timezone.now()
+        with freeze_time(now - timedelta(days=31)):
+            old_done = Job.objects.create(kind=TWEET, status=Job.DONE)
+            old_failed = Job.objects.create(kind=TWEET, status=Job.FAILED)
+            old_sent = OutgoingEmail.objects.create(subject='件名', status=OutgoingEmail.SENT, sent_at=timezone.now())
+            old_pending = OutgoingEmail.objects.create(subject='件名')
+        new_done = Job.objects.create(kind=TWEET, status=Job.DONE)
+        new_sent = OutgoingEmail.objects.create(subject='件名', status=OutgoingEmail.SENT, sent_at=now)
+
+        call_command('purge_finished_jobs', days=30, batch_size=1, stdout=StringIO())
+
+        self.assertSetEqual(set(Job.objects.all()), {old_failed, new_done})
+        self.assertSetEqual(set(OutgoingEmail.objects.all()), {old_pending, new_sent})
+        self.assertFalse(Job.objects.filter(pk=old_done.pk).exists())
+        self.assertFalse(OutgoingEmail.objects.filter(pk=old_sent.pk).exists())
+
+
+@override_settings(NOTIFICATIONS_BATCH_SIZE=2, NOTIFICATIONS_ASYNC_THRESHOLD=3)
+class TestNotifyMany(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tip = TipFactory()
+        self.users = [UserFactory() for _ in range(3)]
+        self.inactive_user = UserFactory(is_active=False)
+
+    def get_users(self):
+        return get_user_model().objects.filter(pk__in=[user.pk for user in self.users + [self.inactive_user]])
+
+    def test_notify_inline(self):
+        """宛先が閾値以下の場合は有効なユーザへのお知らせがその場で作成され、未読件数のcacheが削除されること"""
+
+        self.assertEqual(get_unread_notifications_count(self.users[0]), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_many(self.get_users(), Notification.EVENT, tip=self.tip, content='お知らせ')
+
+        self.assertFalse(Job.objects.filter(kind=NOTIFY).exists())
+        self.assertSetEqual({notification.to_user for notification in Notification.objects.all()}, set(self.users))
+        self.assertEqual(get_unread_notifications_count(self.users[0]), 1)
+
+    def test_notify_async_with_dedup_key(self):
+        """宛先が閾値を超える場合はjobで作成され、同じdedup_keyのお知らせは重複して作成されないこと"""
+
+        self.users.append(UserFactory())
+        notify_many(self.get_users(), Notification.EVENT, tip=self.tip, dedup_key='event:1')
+
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(Job.objects.filter(kind=NOTIFY).count(), 2)
+
+        notify_many(self.get_users(), Notification.EVENT, tip=self.tip, dedup_key='event:1')
+        self.assertEqual(run_pending_jobs(kinds=[NOTIFY]), (4, 4))
+
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertSetEqual({notification.to_user for notification in Notification.objects.all()}, set(self.users))
+
+    def test_notify_dedup_key_too_long(self):
+        """dedup_keyがfieldの長さを超える場合はお知らせもjobも作成されないこと"""
+
+        with self.assertRaises(ValueError):
+            notify_many(self.get_users(), Notification.EVENT, tip=self.tip, dedup_key='x' * 101)
+
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(Job.objects.filter(kind=NOTIFY).exists())
+
+    def test_notify_async_retry(self):
+        """dedup_keyを指定しなくても、jobの再試行でお知らせが重複して作成されないこと"""
+
+        self.users.append(UserFactory())
+        notify_many(self.get_users(), Notification.EVENT, tip=self.tip)
+        notify_many(self.get_users(), Notification.EVENT, tip=self.tip)
+        self.assertEqual(run_pending_jobs(kinds=[NOTIFY]), (4, 4))
+
+        # 作成後に失敗した扱いで再試行
+        Job.objects.filter(kind=NOTIFY).update(status=Job.PENDING, run_at=timezone.now())
+        self.assertEqual(run_pending_jobs(kinds=[NOTIFY]), (4, 4))
+
+        # 別の呼び出しのお知らせは作成され、再試行の分は作成されないこと
+        self.assertEqual(Notification.objects.count(), 8)
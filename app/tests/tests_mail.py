@@ -0,0 +1,114 @@
+from io import StringIO
+from unittest import mock
+
+from app.mail import send_queued_emails
+from app.models import OutgoingEmail
+from django.core import mail
+from django.core.mail import (BadHeaderError, EmailMessage,
+                              EmailMultiAlternatives, get_connection)
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+@override_settings(
+    EMAIL_BACKEND='app.mail.QueuedEmailBackend',
+    EMAIL_OUTBOX_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    JOB_MAX_ATTEMPTS=2,
+)
+class TestQueuedEmail(TestCase):
+
+    def test_contact_mail_is_sent_by_worker(self):
+        """お問い合わせのメールは送信待ちに登録され、workerで送信されること"""
+
+        form_data = {'name': '名前', 'email': 'test@example.com', 'message': 'メッセージ'}
+        response = self.client.post(reverse('app:contact'), form_data)
+
+        self.assertRedirects(response, reverse('app:thanks'), status_code=302, target_status_code=200)
+        self.assertEqual(len(mail.outbox), 0)
+        outgoing_email = OutgoingEmail.objects.get()
+        self.assertEqual(outgoing_email.status, OutgoingEmail.PENDING)
+        self.assertListEqual(outgoing_email.to, ['test@example.com'])
+
+        call_command('send_queued_emails', stdout=StringIO())
+        outgoing_email.refresh_from_db()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, '[TipStock]お問い合わせありがとうございます。')
+        self.assertListEqual(mail.outbox[0].to, ['test@example.com'])
+        self.assertListEqual(mail.outbox[0].bcc, outgoing_email.bcc)
+        self.assertEqual(outgoing_email.status, OutgoingEmail.SENT)
+        self.assertIsNotNone(outgoing_email.sent_at)
+
+    def test_send_with_one_connection(self):
+        """複数のメールを1つの接続で送信し、代替の本文(html)も送信されること"""
+
+        EmailMessage('件名1', '本文1', to=['a@example.com']).send()
+        EmailMessage('件名2', '本文2', to=['b@example.com']).send()
+        message = EmailMultiAlternatives('件名3', '本文3', to=['c@example.com'])
+        message.attach_alternative('<p>本文3</p>', 'text/html')
+        message.send()
+
+        with mock.patch('app.mail.get_connection', wraps=get_connection) as get_connection_mock:
+            self.assertEqual(send_queued_emails(), (3, 3))
+
+        get_connection_mock.assert_called_once()
+        self.assertListEqual([message.subject for message in mail.outbox], ['件名1', '件名2', '件名3'])
+        self.assertListEqual(mail.outbox[2].alternatives, [('<p>本文3</p>', 'text/html')])
+
+    def test_retry_and_fail(self):
+        """送信に失敗した場合は再送信待ちになり、最大試行回数を超えると失敗になること"""
+
+        EmailMessage('件名', '本文', to=['a@example.com']).send()
+        outgoing_email = OutgoingEmail.objects.get()
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('timeout')), \
+                self.assertLogs('app.mail', level='ERROR'):
+            self.assertEqual(send_queued_emails(), (1, 0))
+            outgoing_email.refresh_from_db()
+
+            self.assertEqual(outgoing_email.status, OutgoingEmail.PENDING)
+            self.assertEqual(outgoing_email.last_error, 'OSError: timeout')
+
+            # 再送信までの待機中は送信されないこと
+            self.assertEqual(send_queued_emails(), (0, 0))
+            OutgoingEmail.objects.update(run_at=outgoing_email.created_at)
+            self.assertEqual(send_queued_emails(), (1, 0))
+
+        outgoing_email.refresh_from_db()
+        self.assertEqual(outgoing_email.status, OutgoingEmail.FAILED)
+        self.assertEqual(outgoing_email.attempts, 2)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_connection_error(self):
+        """接続に失敗した場合は取得した全てのメールが再送信待ちになり、最大試行回数を超えると失敗になること"""
+
+        EmailMessage('件名1', '本文1', to=['a@example.com']).send()
+        EmailMessage('件名2', '本文2', to=['b@example.com']).send()
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('refused')), \
+                self.assertLogs('app.mail', level='ERROR'):
+            self.assertEqual(send_queued_emails(), (2, 0))
+
+            for outgoing_email in OutgoingEmail.objects.all():
+                self.assertEqual(outgoing_email.status, OutgoingEmail.PENDING)
+                self.assertEqual(outgoing_email.attempts, 1)
+                self.assertEqual(outgoing_email.last_error, 'OSError: refused')
+                self.assertGreater(outgoing_email.run_at, outgoing_email.created_at)
+
+            OutgoingEmail.objects.update(run_at=outgoing_email.created_at)
+            self.assertEqual(send_queued_emails(), (2, 0))
+
+        self.assertListEqual(
+            list(OutgoingEmail.objects.values_list('status', 'attempts')),
+            [(OutgoingEmail.FAILED, 2), (OutgoingEmail.FAILED, 2)],
+        )
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_bad_header(self):
+        """ヘッダの誤りは登録時にエラーになること"""
+
+        with self.assertRaises(BadHeaderError):
+            EmailMessage('件名\n改行', '本文', to=['a@example.com']).send()
+
+        self.assertFalse(OutgoingEmail.objects.exists())
@@ -1,9 +1,17 @@
+import gzip
+import json
 import os
-from datetime import datetime
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 
 from accounts.tests.factories import UserFactory
 from app.models import Code, Comment, Like, Notification, Tip
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, transaction
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from freezegun import freeze_time
 
@@ -74,6 +82,98 @@ class TestTip(TestCase):
         like = LikeFactory(tip=tip, created_by=like_created_by)
         self.assertTrue(tip.is_liked_by_user(like_created_by))
 
+    def test_like_count(self):
+        """Likeの登録・削除でお気に入り数が更新されること"""
+        tip = TipFactory()
+        updated_at = Tip.objects.get(pk=tip.pk).updated_at
+        like1 = LikeFactory(tip=tip)
+        like2 = LikeFactory(tip=tip)
+
+        self.assertEqual(Tip.objects.get(pk=tip.pk).like_count, 2)
+
+        like1.delete()
+        Like.objects.filter(pk=like2.pk).delete()
+        actual_tip = Tip.objects.get(pk=tip.pk)
+
+        self.assertEqual(actual_tip.like_count, 0)
+        # updated_atは更新されないこと
+        self.assertEqual(actual_tip.updated_at, updated_at)
+
+    def test_like_count_after_saving_loaded_tip(self):
+        """お気に入りの登録前に読み込んだtipを保存しても、お気に入り数が読み込み時の値に戻らないこと"""
+        tip = TipFactory()
+        loaded_tip = Tip.objects.get(pk=tip.pk)
+        LikeFactory(tip=tip)
+
+        loaded_tip.title = '更新'
+        loaded_tip.save()
+
+        self.assertEqual(Tip.objects.get(pk=tip.pk).like_count, 1)
+
+    def test_save_deleted_tip(self):
+        """読み込み後に削除されたtipは保存しても作成し直さず、エラーになること"""
+        tip = TipFactory()
+        loaded_tip = Tip.objects.get(pk=tip.pk)
+        tip.delete()
+
+        loaded_tip.title = '更新'
+        with self.assertRaisesMessage(DatabaseError, 'did not affect any rows'):
+            with transaction.atomic():
+                loaded_tip.save()
+
+        self.assertFalse(Tip.objects.filter(pk=tip.pk).exists())
+
+    def test_reconcile_like_count(self):
+        """コマンドでお気に入り数のずれが修正されること"""
+        tip1 = TipFactory()
+        tip2 = TipFactory()
+        LikeFactory.create_batch(2, tip=tip1)
+        Tip.objects.filter(pk=tip1.pk).update(like_count=5)
+        Tip.objects.filter(pk=tip2.pk).update(like_count=1)
+
+        call_command('reconcile_like_count', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(Tip.objects.get(pk=tip1.pk).like_count, 2)
+        self.assertEqual(Tip.objects.get(pk=tip2.pk).like_count, 0)
+
+    def test_description_html(self):
+        """保存時に説明の表示用HTMLが作成され、説明の変更時のみ作り直されること"""
+
+        tip = TipFactory(description='<b>説明</b>\nhttps://example.com')
+
+        self.assertEqual(
+            tip.description_html,
+            '<p>&lt;b&gt;説明&lt;/b&gt;<br><a target="_blank"  rel="noopener" '
+            'href="https://example.com" rel="nofollow">https://example.com</a></p>',
+        )
+
+        tip = Tip.objects.get(pk=tip.pk)
+        with mock.patch('app.models.render_description') as render_mock:
+            tip.title = '変更'
+            tip.save()
+            render_mock.assert_not_called()
+
+        tip.description = '変更後'
+        tip.save()
+        self.assertEqual(Tip.objects.get(pk=tip.pk).description_html, '<p>変更後</p>')
+
+    def test_backfill_description_html(self):
+        """コマンドで説明の表示用HTMLが未作成のtipのHTMLが作成され、更新日時は変更されないこと"""
+        tip1 = TipFactory(description='説明1')
+        tip2 = TipFactory(description='説明2')
+        Tip.objects.filter(pk=tip1.pk).update(description_html='')
+        Tip.objects.filter(pk=tip2.pk).update(description_html='<p>作成済み</p>')
+
+        call_command('backfill_description_html', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(Tip.objects.get(pk=tip1.pk).description_html, '<p>説明1</p>')
+        self.assertEqual(Tip.objects.get(pk=tip1.pk).updated_at, tip1.updated_at)
+        self.assertEqual(Tip.objects.get(pk=tip2.pk).description_html, '<p>作成済み</p>')
+
+        call_command('backfill_description_html', all=True, stdout=StringIO())
+
+        self.assertEqual(Tip.objects.get(pk=tip2.pk).description_html, '<p>説明2</p>')
+
 
 
 class TestCode(TestCase):
@@ -111,6 +211,41 @@ class TestCode(TestCase):
         self.assertEqual(actual_code.filename, filename)
         self.assertEqual(actual_code.content, content)
 
+    def test_highlighted_on_save(self):
+        """保存時にファイル名の拡張子に応じてハイライトしたHTMLが作成され、同じ内容はcacheを使用すること"""
+
+        cache.clear()
+        code = CodeFactory(filename='file1.py', content='def f():\n    return "<a>"')
+
+        self.assertIn('<span class="k">def</span>', code.highlighted)
+        self.assertIn('&lt;a&gt;', code.highlighted)
+        self.assertNotIn('<a>', code.highlighted)
+
+        with mock.patch('app.highlight.highlight') as highlight_mock:
+            CodeFactory(filename='file2.py', content=code.content)
+            highlight_mock.assert_not_called()
+
+        # 拡張子が不明な場合はハイライトしないこと
+        code = CodeFactory(filename='memo', content='def f()')
+        self.assertNotIn('<span class="k">', code.highlighted)
+        self.assertIn('def f()', code.highlighted)
+
+    def test_backfill_code_highlighted(self):
+        """コマンドでハイライトしたHTMLが未作成のコードのHTMLが作成されること"""
+        code1 = CodeFactory(filename='file1.py', content='def f():')
+        code2 = CodeFactory(filename='file2.py', content='def g():')
+        Code.objects.filter(pk=code1.pk).update(highlighted='')
+        Code.objects.filter(pk=code2.pk).update(highlighted='<pre>作成済み</pre>')
+
+        call_command('backfill_code_highlighted', batch_size=1, stdout=StringIO())
+
+        self.assertIn('<span class="k">def</span>', Code.objects.get(pk=code1.pk).highlighted)
+        self.assertEqual(Code.objects.get(pk=code2.pk).highlighted, '<pre>作成済み</pre>')
+
+        call_command('backfill_code_highlighted', all=True, stdout=StringIO())
+
+        self.assertIn('<span class="k">def</span>', Code.objects.get(pk=code2.pk).highlighted)
+
 
 class TestComment(TestCase):
 
@@ -164,6 +299,45 @@ class TestComment(TestCase):
         self.assertEqual(actual_comment.created_by.username, create_username)
         self.assertEqual(actual_comment.created_at, now)
 
+    def test_next_comment_no(self):
+        """コメントの番号が登録済みの番号に続けて採番されること"""
+
+        tip = TipFactory()
+        CommentFactory(tip=tip, no=3)
+
+        self.assertEqual(tip.next_comment_no(), 4)
+        self.assertEqual(tip.next_comment_no(), 5)
+        self.assertEqual(Tip.objects.get(pk=tip.pk).comment_seq, 5)
+        self.assertEqual(TipFactory().next_comment_no(), 1)
+
+    def test_next_comment_no_after_saving_loaded_tip(self):
+        """コメントの登録前に読み込んだtipを保存しても、採番が読み込み時の値に戻らないこと"""
+
+        tip = TipFactory()
+        loaded_tip = Tip.objects.get(pk=tip.pk)
+        with transaction.atomic():
+            CommentFactory(tip=tip, no=Tip.objects.get(pk=tip.pk).next_comment_no())
+
+        loaded_tip.title = '更新'
+        loaded_tip.save()
+        with transaction.atomic():
+            CommentFactory(tip=tip, no=Tip.objects.get(pk=tip.pk).next_comment_no())
+
+        actual_tip = Tip.objects.get(pk=tip.pk)
+        self.assertEqual(actual_tip.title, '更新')
+        self.assertEqual(actual_tip.comment_seq, 2)
+        self.assertListEqual(list(Comment.objects.filter(tip=tip).order_by('no').values_list('no', flat=True)), [1, 2])
+
+    def test_unique_no(self):
+        """同じtipで同じ番号のコメントは登録できないこと"""
+
+        tip = TipFactory()
+        CommentFactory(tip=tip, no=1)
+        CommentFactory(no=1)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CommentFactory(tip=tip, no=1)
+
 
 class LikeComment(TestCase):
 
@@ -252,3 +426,25 @@ class TestNotification(TestCase):
         self.assertEqual(actual_notification.created_by.username, create_username)
         self.assertEqual(actual_notification.created_at, now)
 
+    @override_settings(NOTIFICATIONS_RETENTION_DAYS=30)
+    def test_purge_notifications(self):
+        """保存期間を過ぎた既読のお知らせのみ削除され、アーカイブに保存されること"""
+
+        now = timezone.now()
+        with freeze_time(now - timedelta(days=31)):
+            old_read_notifications = [NotificationFactory(is_read=True, content=f'お知らせ{i}') for i in range(3)]
+            old_unread_notification = NotificationFactory(is_read=False)
+        new_read_notification = NotificationFactory(is_read=True)
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            archive = os.path.join(archive_dir, 'notifications.jsonl.gz')
+            call_command('purge_notifications', archive=archive, batch_size=2, stdout=StringIO())
+
+            with gzip.open(archive, 'rt', encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f]
+
+        self.assertSetEqual(
+            set(Notification.objects.values_list('pk', flat=True)), {old_unread_notification.pk, new_read_notification.pk}
+        )
+        self.assertListEqual([row['id'] for row in rows], [notification.pk for notification in old_read_notifications])
+        self.assertListEqual([row['content'] for row in rows], ['お知らせ0', 'お知らせ1', 'お知らせ2'])
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+from accounts.tests.factories import UserFactory
+from app.models import Tip
+from app.pagination import CursorPaginator, InvalidCursor
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .factories import LikeFactory, TipFactory
+
+
+class TestCursorPaginator(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        updated_at = timezone.make_aware(datetime(2021, 3, 4, 14, 57, 11))
+        # updated_atが同じtipを含めて作成
+        cls.tips = [
+            TipFactory(created_by=cls.user, public_set='public', updated_at=updated_at + timedelta(seconds=i // 2))
+            for i in range(7)
+        ]
+
+    def get_all_pages(self, queryset, per_page):
+        paginator = CursorPaginator(queryset, per_page)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_next_pages(self):
+        """次ページを順にたどると、重複・欠落なく並び順通りに取得できること"""
+
+        queryset = Tip.objects.order_by('-updated_at')
+        paginator, pages = self.get_all_pages(queryset, 3)
+
+        self.assertListEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertListEqual([tip for page in pages for tip in page], list(queryset.order_by('-updated_at', '-pk')))
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[1].has_previous())
+        self.assertIsNone(paginator.count)
+
+    def test_previous_pages(self):
+        """前ページのcursorで同じページに戻れること"""
+
+        paginator, pages = self.get_all_pages(Tip.objects.order_by('-updated_at'), 3)
+        previous_page = paginator.page(pages[2].previous_cursor)
+
+        self.assertListEqual(list(previous_page), list(pages[1]))
+        self.assertTrue(previous_page.has_next())
+        self.assertTrue(previous_page.has_previous())
+
+        first_page = paginator.page(previous_page.previous_cursor)
+
+        self.assertListEqual(list(first_page), list(pages[0]))
+        self.assertFalse(first_page.has_previous())
+
+    def test_liked_order(self):
+        """お気に入り数順(like_count, updated_at, pk)でページングできること"""
+
+        LikeFactory.create_batch(2, tip=self.tips[0])
+        LikeFactory(tip=self.tips[3])
+        queryset = Tip.objects.order_by('-like_count', '-updated_at')
+        _, pages = self.get_all_pages(queryset, 2)
+
+        self.assertListEqual([tip for page in pages for tip in page], list(queryset.order_by('-like_count', '-updated_at', '-pk')))
+
+    def test_invalid_cursor(self):
+        """改ざん、並び順の異なるcursorはエラーになること"""
+
+        paginator = CursorPaginator(Tip.objects.order_by('-updated_at'), 3)
+        cursor = paginator.page().next_cursor
+
+        with self.assertRaises(InvalidCursor):
+            paginator.page(cursor + 'x')
+        with self.assertRaises(InvalidCursor):
+            CursorPaginator(Tip.objects.order_by('-like_count', '-updated_at'), 3).page(cursor)
+
+
+@override_settings(TIP_LIST_CURSOR_PAGINATION=True)
+class TestCursorPaginationView(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.tip_public_list_url = reverse('app:tip_public_list')
+
+    def setUp(self):
+        # 前のテストでcacheされたページを使用しないよう削除
+        cache.clear()
+
+    def test_get_request_with_cursor(self):
+        """cursor方式でページングし、検索条件が引き継がれること"""
+
+        from app.views import TipPublicListView
+
+        TipFactory.create_batch(TipPublicListView.paginate_by + 1, created_by=self.user, public_set='public')
+
+        response = self.client.get(self.tip_public_list_url, {'displayOrder': 'liked'})
+        page_obj = response.context_data['page_obj']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'app/cursor_pagenation.html')
+        self.assertTrue(page_obj.has_next())
+        self.assertContains(response, 'displayOrder=liked&amp;cursor=')
+
+        response = self.client.get(self.tip_public_list_url, {'displayOrder': 'liked', 'cursor': page_obj.next_cursor})
+        page_obj = response.context_data['page_obj']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(page_obj), 1)
+        self.assertFalse(page_obj.has_next())
+        self.assertTrue(page_obj.has_previous())
+
+    def test_get_request_with_invalid_cursor(self):
+        """不正なcursorは404になること"""
+
+        response = self.client.get(self.tip_public_list_url, {'cursor': 'invalid'})
+
+        self.assertEqual(response.status_code, 404)
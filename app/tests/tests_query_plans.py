@@ -0,0 +1,92 @@
+import unittest
+
+from accounts.tests.factories import UserFactory
+from app.models import Comment, Notification, Tip
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQLのみ')
+class TestQueryPlans(TestCase):
+    """
+    主要な画面のqueryがindexを使用すること(データを登録して統計情報を更新した状態で実行計画を確認)
+    実行計画は画面を表示して実際に発行されたqueryで確認する
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [UserFactory() for _ in range(5)]
+        Tip.objects.bulk_create([
+            Tip(
+                title=f'タイトル{i}', description='説明', created_by=user,
+                public_set=Tip.PRIVATE if i % 10 == 0 else Tip.PUBLIC,
+            )
+            for user in cls.users for i in range(2000)
+        ])
+        cls.tip = Tip.objects.filter(public_set=Tip.PUBLIC).first()
+        Comment.objects.bulk_create([
+            Comment(tip=tip, no=no, text='コメント', created_by=cls.users[0])
+            for tip in Tip.objects.filter(public_set=Tip.PUBLIC)[:200] for no in range(1, 11)
+        ])
+        Notification.objects.bulk_create([
+            Notification(to_user=user, category=Notification.COMMENT, is_read=bool(i % 10))
+            for user in cls.users for i in range(2000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        # cacheされたページ、統計ではqueryが発行されないため
+        cache.clear()
+
+    def get_plans(self, url, model, data=None):
+        """urlを表示して発行された、modelのtableをFROMに含むSELECT文の実行計画のリストを返す"""
+        table = model._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if sql.startswith('SELECT') and f'FROM "{table}"' in sql:
+                    cursor.execute(f'EXPLAIN {sql}')
+                    plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        self.assertTrue(plans, f'{url}で{table}のqueryが発行されていません')
+        return plans
+
+    def assertViewUsesIndex(self, url, model, index_name, data=None):
+        plans = self.get_plans(url, model, data)
+        self.assertTrue(any(index_name in plan for plan in plans), '\n\n'.join(plans))
+
+    def test_tip_list(self):
+        """tip一覧(更新日順)"""
+
+        self.assertViewUsesIndex(reverse('app:tip_public_list'), Tip, 'tip_public_updated_idx')
+
+    def test_user_tips(self):
+        """ユーザのtip一覧、プロフィールのtip件数"""
+
+        user = self.users[0]
+        self.assertViewUsesIndex(reverse('app:usertip', kwargs={'id': user.pk}), Tip, 'tip_created_by_public_idx')
+        self.client.force_login(user)
+        self.assertViewUsesIndex(reverse('accounts:profile'), get_user_model(), 'tip_created_by_public_idx')
+
+    def test_notifications(self):
+        """お知らせ一覧(全て、未確認のみ)"""
+
+        self.client.force_login(self.users[0])
+        url = reverse('app:notifications')
+        self.assertViewUsesIndex(url, Notification, 'notification_inbox_idx', {'display': 'all'})
+        self.assertViewUsesIndex(url, Notification, 'notification_unread_idx')
+
+    def test_comments(self):
+        """tip詳細のコメント"""
+
+        url = reverse('app:tip_detail', kwargs={'pk': self.tip.pk})
+        self.assertViewUsesIndex(url, Comment, 'unique_comment_no')
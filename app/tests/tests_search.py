@@ -0,0 +1,184 @@
+import unittest
+from io import StringIO
+
+from accounts.tests.factories import UserFactory
+from app.models import Tip, TipSearchToken
+from app.search import normalize_text, search_tips, update_search_document
+from app.tokenizers import NgramTokenizer
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from .factories import CodeFactory, TipFactory
+
+
+class TestSearchDocument(TestCase):
+
+    def test_document_is_updated_by_tip_code_and_tags(self):
+        """tip,code,tagsの保存・削除で検索用文書が更新されること"""
+
+        tip = TipFactory(title='Djangoのモデル', description='説明文', tags=['ORM'])
+        code = CodeFactory(tip=tip, filename='models.py', content='class Foo(models.Model):')
+        document = Tip.objects.get(pk=tip.pk).search_document
+
+        self.assertIn('djangoのモデル', document)
+        self.assertIn('説明文', document)
+        self.assertIn('orm', document)
+        self.assertIn('models.py', document)
+        self.assertIn('class foo(models.model):', document)
+
+        code.delete()
+        tip.tags.remove('ORM')
+        document = Tip.objects.get(pk=tip.pk).search_document
+
+        self.assertNotIn('models.py', document)
+        self.assertNotIn('orm', document)
+
+    def test_document_is_updated_by_clearing_tags(self):
+        """タグのclear・タグ自体の削除・タグ名の変更で検索用文書が更新されること"""
+
+        tip1 = TipFactory(tags=['ORM', 'Python'])
+        tip2 = TipFactory(tags=['Python'])
+
+        tip1.tags.clear()
+
+        self.assertNotIn('orm', Tip.objects.get(pk=tip1.pk).search_document)
+
+        tag = tip2.tags.get()
+        tag.name = 'Python3'
+        tag.save()
+
+        self.assertIn('python3', Tip.objects.get(pk=tip2.pk).search_document)
+
+        tag.delete()
+
+        self.assertNotIn('python', Tip.objects.get(pk=tip2.pk).search_document)
+
+    def test_normalize_text(self):
+        """全角半角、大文字小文字が統一されること"""
+
+        self.assertEqual(normalize_text('ＡＢＣabc'), 'abcabc')
+        self.assertEqual(normalize_text(None), '')
+
+    def test_search_tips(self):
+        """部分一致、大文字小文字を区別せずに検索できること"""
+
+        tip1 = TipFactory(title='非同期処理のサンプル', description='asyncio')
+        tip2 = TipFactory(title='リスト内包表記', description='説明')
+        CodeFactory(tip=tip2, filename='comp.py', content='Squares = [x ** 2 for x in range(10)]')
+
+        self.assertCountEqual(search_tips(Tip.objects.all(), '非同期'), [tip1])
+        self.assertCountEqual(search_tips(Tip.objects.all(), 'squares'), [tip2])
+        self.assertCountEqual(search_tips(Tip.objects.all(), 'ＡＳＹＮＣ'), [tip1])
+        self.assertFalse(search_tips(Tip.objects.all(), '存在しない').exists())
+
+    def test_rebuild_search_index(self):
+        """コマンドで検索用文書・インデックスが再作成されること"""
+
+        tip = TipFactory(title='タイトル')
+        Tip.objects.filter(pk=tip.pk).update(search_document='')
+        TipSearchToken.objects.all().delete()
+
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+
+        self.assertIn('タイトル', Tip.objects.get(pk=tip.pk).search_document)
+        self.assertTrue(TipSearchToken.objects.filter(tip=tip, token='タイ').exists())
+
+
+class TestNgramTokenizer(unittest.TestCase):
+
+    def setUp(self):
+        self.tokenizer = NgramTokenizer()
+
+    def test_tokenize(self):
+        """CJKはbigram(末尾は1文字も)に分割され、英数字はtokenにしないこと"""
+
+        tokens = list(self.tokenizer.tokenize('非同期処理 def my_func() 関数'))
+
+        self.assertListEqual(tokens, ['非同', '同期', '期処', '処理', '理', '関数', '数'])
+
+    def test_tokenize_query(self):
+        """検索内容のCJKの1文字は前方一致になり、単語はtokenにしないこと"""
+
+        self.assertListEqual(self.tokenizer.tokenize_query('ＤＥＦ 処理 非'), [
+            ('処理', False), ('非', True),
+        ])
+
+
+class TestSearchIndex(TestCase):
+
+    def test_index_is_updated_incrementally(self):
+        """tip,codeの保存・削除でインデックスが更新されること"""
+
+        tip = TipFactory(title='非同期', description='説明')
+        code = CodeFactory(tip=tip, filename='a.py', content='# 待機\nawait asyncio.sleep(1)')
+
+        self.assertTrue(TipSearchToken.objects.filter(tip=tip, token='非同').exists())
+        self.assertTrue(TipSearchToken.objects.filter(tip=tip, token='待機').exists())
+        self.assertFalse(TipSearchToken.objects.filter(tip=tip, token='asyncio').exists())
+
+        code.delete()
+
+        self.assertFalse(TipSearchToken.objects.filter(tip=tip, token='待機').exists())
+
+        tip.delete()
+
+        self.assertFalse(TipSearchToken.objects.exists())
+
+    def test_update_deleted_tip(self):
+        """削除済みのtipの検索用文書・インデックスは作成しないこと"""
+
+        tip = TipFactory(title='非同期')
+        Tip.objects.filter(pk=tip.pk).delete()
+
+        update_search_document(tip)
+
+        self.assertFalse(TipSearchToken.objects.exists())
+
+    def test_search_japanese_with_index(self):
+        """日本語の部分一致(1文字、複数文字)で検索できること"""
+
+        tip1 = TipFactory(title='非同期処理のサンプル', description='説明')
+        tip2 = TipFactory(title='同期処理', description='説明')
+
+        self.assertCountEqual(search_tips(Tip.objects.all(), '非同期'), [tip1])
+        self.assertCountEqual(search_tips(Tip.objects.all(), '期処理'), [tip1, tip2])
+        self.assertCountEqual(search_tips(Tip.objects.all(), '非'), [tip1])
+        self.assertCountEqual(search_tips(Tip.objects.all(), '理'), [tip1, tip2])
+        self.assertFalse(search_tips(Tip.objects.all(), '理同').exists())
+
+
+    def test_search_middle_of_word_with_index(self):
+        """単語の途中から一致する検索内容(英数字、_区切り)でも検索できること"""
+
+        tip = TipFactory(title='非同期処理', description='説明')
+        CodeFactory(tip=tip, filename='a.py', content='await asyncio.sleep(1)\nmy_func()')
+        TipFactory(title='同期処理', description='説明')
+
+        self.assertCountEqual(search_tips(Tip.objects.all(), 'sync'), [tip])
+        self.assertCountEqual(search_tips(Tip.objects.all(), '_func'), [tip])
+        self.assertFalse(search_tips(Tip.objects.all(), 'asyncio2').exists())
+
+
+class TestSearchRelevance(TestCase):
+
+    def setUp(self):
+        # 前のテストでcacheされたページを使用しないよう削除
+        cache.clear()
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQLのみ')
+    def test_get_request_with_display_order_relevance(self):
+        """displayOrder=relevanceで関連度順(titleの一致を優先)になること"""
+
+        user = UserFactory()
+        code_tip = TipFactory(title='タイトル', description='説明', created_by=user, public_set='public')
+        CodeFactory(tip=code_tip, filename='a.py', content='print(sample)')
+        title_tip = TipFactory(title='sample', description='説明', created_by=user, public_set='public')
+
+        response = self.client.get(reverse('app:tip_public_list'), {'query': 'sample', 'displayOrder': 'relevance'})
+        tip_list = response.context_data['tip_list']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(list(tip_list), [title_tip, code_tip])
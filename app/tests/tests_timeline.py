@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from io import StringIO
+
+from accounts.tests.factories import UserFactory
+from app.jobs import run_pending_jobs
+from app.models import TimelineEntry, Tip
+from app.tasks import TIMELINE_FANOUT
+from app.timeline import TimelinePaginator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .factories import TipFactory
+
+
+class TestTimeline(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.author = UserFactory()
+        self.user.follows.add(self.author)
+
+    def test_fanout_on_write(self):
+        """publicのtipの作成・更新でフォロワーのタイムラインに展開され、非公開への変更で削除されること"""
+
+        tip = TipFactory(created_by=self.author, public_set='public')
+        run_pending_jobs(kinds=[TIMELINE_FANOUT])
+
+        entry = TimelineEntry.objects.get(user=self.user)
+        self.assertEqual(entry.tip, tip)
+        self.assertEqual(entry.tip_updated_at, tip.updated_at)
+
+        tip.title = '更新'
+        tip.save()
+        run_pending_jobs(kinds=[TIMELINE_FANOUT])
+
+        self.assertEqual(TimelineEntry.objects.get(user=self.user).tip_updated_at, Tip.objects.get(pk=tip.pk).updated_at)
+
+        tip.public_set = 'private'
+        tip.save()
+        run_pending_jobs(kinds=[TIMELINE_FANOUT])
+
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_follow_and_unfollow(self):
+        """フォローで最新のtipが追加され、フォロー解除で削除されること"""
+
+        other = UserFactory()
+        tip = TipFactory(created_by=other, public_set='public')
+        TipFactory(created_by=other, public_set='private')
+
+        self.user.follows.add(other)
+
+        self.assertListEqual(list(TimelineEntry.objects.filter(user=self.user).values_list('tip', flat=True)), [tip.pk])
+
+        self.user.follows.remove(other)
+
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_hybrid_fanout_on_read(self):
+        """フォロワーが多いユーザのtipは展開されず、表示時にマージされること"""
+
+        follower = UserFactory()
+        follower.follows.add(self.author)
+        popular_author = self.author
+        normal_author = UserFactory()
+        self.user.follows.add(normal_author)
+        updated_at = timezone.make_aware(datetime(2021, 3, 4, 15, 0, 0))
+        tips = []
+        for i, author in enumerate([popular_author, normal_author, popular_author, normal_author]):
+            tip = TipFactory(created_by=author, public_set='public')
+            Tip.objects.filter(pk=tip.pk).update(updated_at=updated_at + timedelta(minutes=i))
+            tips.append(tip)
+        run_pending_jobs(kinds=[TIMELINE_FANOUT])
+
+        self.assertFalse(TimelineEntry.objects.filter(tip__created_by=popular_author).exists())
+
+        paginator = TimelinePaginator(self.user, 3)
+        page = paginator.page()
+
+        self.assertListEqual(list(page), [tips[3], tips[2], tips[1]])
+        self.assertTrue(page.has_next())
+
+        page = paginator.page(page.next_cursor)
+
+        self.assertListEqual(list(page), [tips[0]])
+        self.assertFalse(page.has_next())
+
+    def test_get_request(self):
+        """getリクエストでタイムラインが表示されること"""
+
+        tip = TipFactory(created_by=self.author, public_set='public')
+        TipFactory(public_set='public')
+        run_pending_jobs(kinds=[TIMELINE_FANOUT])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('app:timeline'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'app/timeline.html')
+        self.assertListEqual(list(response.context['object_list']), [tip])
+
+        response = self.client.get(reverse('app:timeline'), {'cursor': 'invalid'})
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_backfill_timeline(self):
+        """コマンドでフォローしているユーザのtipがタイムラインに追加されること"""
+
+        tip = TipFactory(created_by=self.author, public_set='public')
+        TimelineEntry.objects.all().delete()
+
+        call_command('backfill_timeline', batch_size=1, stdout=StringIO())
+
+        self.assertListEqual(list(TimelineEntry.objects.values_list('user', 'tip')), [(self.user.pk, tip.pk)])
@@ -1,17 +1,25 @@
+import hashlib
 import os
 import unittest
 import urllib
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest import mock
 
 from accounts.tests.factories import UserFactory
+from app.caching import get_cache_version
 from app.models import Code, Comment, Like, Notification, Tip
 from app.tests.factories import (CodeFactory, CommentFactory, LikeFactory,
                                  NotificationFactory, TipFactory)
+from app.utils import create_notification, get_unread_notifications_count
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core import mail
+from django.core.cache import cache
 from django.core.mail import BadHeaderError
-from django.test import Client, TestCase
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from freezegun import freeze_time
@@ -23,6 +31,9 @@ class TestIndexView(TestCase):
     def setUpTestData(cls):
         cls.user = UserFactory()
         cls.url =reverse('app:index')
+
+    def setUp(self):
+        cache.clear()
         
     def test_get_request_by_anonymous_user(self):
         """getリクエストの正常確認（未ログインユーザ）"""
@@ -168,6 +179,10 @@ class TestTipDetailView(TestCase):
         cls.public_tip_url =reverse('app:tip_detail', args=[cls.public_tip.pk])
         cls.public_tip2_url =reverse('app:tip_detail', args=[cls.public_tip_no_comment_and_like.pk])
 
+    def setUp(self):
+        # 前のテストでcacheされたページを使用しないよう削除
+        cache.clear()
+
     def test_get_request_to_private_tip_by_anonymous_user(self):
         """getリクエスト/未ログインユーザ/PrivateTip/403エラー"""
         
@@ -246,6 +261,9 @@ class TestTipDetailView(TestCase):
         self.assertEqual(codes.count(), 1)
         self.assertEqual(codes[0].filename, self.code.filename)
         self.assertEqual(codes[0].content, self.code.content)
+        # ハイライト済みのHTMLが表示されること
+        self.assertContains(response, '<div class="highlight">')
+        self.assertNotContains(response, 'class="code-content"')
 
     def test_comment_context(self):
         """commentのcontext確認"""
@@ -366,6 +384,10 @@ class TestTipListView(TestCase):
         cls.tip_list_url =reverse('app:tip_list')
         cls.tip_public_list_url =reverse('app:tip_public_list')
 
+    def setUp(self):
+        # 前のテストでcacheされたページを使用しないよう削除
+        cache.clear()
+
     def test_get_request_to_private_tip_by_anonymous_user(self):
         """getリクエスト/未ログインユーザ/tip_list/ログインページにリダイレクト"""
         
@@ -390,6 +412,8 @@ class TestTipListView(TestCase):
         user2_private_tip = TipFactory(created_by=self.user2, public_set='private')
         user2_public_tip = TipFactory(created_by=self.user2, public_set='public')
         like_user2_public_tip_by_user1 = LikeFactory(tip=user2_public_tip, created_by=self.user1)
+        # 他ユーザのお気に入りがあっても重複して表示されないこと
+        LikeFactory.create_batch(2, tip=user2_public_tip)
 
         # user1(お気に入りあり)
         self.client.force_login(self.user1)
@@ -646,6 +670,226 @@ class TestTipListView(TestCase):
         self.assertTrue(page_obj.has_next())
 
 
+class TestPageCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.tip = TipFactory(created_by=self.user, public_set='public', title='タイトル', description='説明')
+
+    def test_public_list_is_cached_for_anonymous_user(self):
+        """未ログインユーザへのtip一覧はcacheされ、tipの変更で更新されること"""
+
+        url = reverse('app:tip_public_list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'タイトル')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tip.title = '変更後'
+            self.tip.save()
+        response = self.client.get(url)
+        self.assertContains(response, '変更後')
+
+        # ログインユーザへのページはcacheしないこと
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, 'app/tip_list.html')
+
+    def test_usertip_is_cached_for_anonymous_user(self):
+        """未ログインユーザへのユーザのtip一覧はcacheされ、ユーザ名の変更で更新されること"""
+
+        url = reverse('app:usertip', args=[self.user.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = 'renamed'
+            self.user.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'renamed')
+
+    def test_profile_change_keeps_other_pages_cached(self):
+        """ユーザ名・アイコン等以外の変更はユーザのページのみ更新し、他のページのcacheは使用すること"""
+
+        list_url = reverse('app:tip_public_list')
+        self.client.get(list_url)
+        user_version = get_cache_version(f'user:{self.user.pk}')
+
+        user = get_user_model().objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.self_introduction = '自己紹介'
+            user.save()
+        with self.assertNumQueries(0):
+            self.client.get(list_url)
+        self.assertNotEqual(get_cache_version(f'user:{self.user.pk}'), user_version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.username = 'renamed'
+            user.save()
+        self.assertContains(self.client.get(list_url), 'renamed')
+
+    def test_detail_is_cached(self):
+        """未ログインユーザへのtip詳細はcacheされ、tip・コメントの変更で更新されること"""
+
+        url = reverse('app:tip_detail', args=[self.tip.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, '<p><p>説明</p></p>')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tip.description = '変更後の説明'
+            self.tip.save()
+            CommentFactory(tip=self.tip, no=1, text='新しいコメント')
+        response = self.client.get(url)
+        self.assertContains(response, '<p><p>変更後の説明</p></p>')
+        self.assertContains(response, '新しいコメント')
+
+    def test_detail_fragment_for_logged_in_user(self):
+        """ログインユーザへのtip詳細はtipの内容がcacheされ、tipの変更で更新されること"""
+
+        self.client.force_login(self.user)
+        url = reverse('app:tip_detail', args=[self.tip.pk])
+        self.client.get(url)
+        # signalを発生させない更新はcacheされた内容が表示されること
+        Tip.objects.filter(pk=self.tip.pk).update(description='cacheされない説明')
+        response = self.client.get(url)
+        self.assertContains(response, '<p><p>説明</p></p>')
+        self.assertNotContains(response, '<p><p>cacheされない説明</p></p>')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tip.description = '変更後の説明'
+            self.tip.save()
+            CommentFactory(tip=self.tip, no=1, text='新しいコメント')
+        response = self.client.get(url)
+        self.assertContains(response, '<p><p>変更後の説明</p></p>')
+        self.assertContains(response, '新しいコメント')
+
+
+class TestConditionalGet(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.now = timezone.make_aware(datetime(2021, 3, 4, 15, 0, 0))
+        with freeze_time(self.now), self.captureOnCommitCallbacks(execute=True):
+            self.tip = TipFactory(created_by=self.user, public_set='public')
+        self.url = reverse('app:tip_detail', args=[self.tip.pk])
+
+    def test_detail_etag(self):
+        """tip詳細はETagが一致する場合はテンプレートを描画せずに304を返し、tipの変更後は200を返すこと"""
+
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tip.title = '変更後'
+            self.tip.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_last_modified(self):
+        """tip詳細のLast-Modifiedはtipの更新日時、最新のコメント・お気に入りの日時、cacheのversionを上げた日時のうち最新のものであること"""
+
+        # versionを上げた日時が未設定のscopeは、取得時の日時が設定されること
+        with freeze_time(self.now):
+            response = self.client.get(self.url)
+        last_modified = response['Last-Modified']
+        self.assertEqual(last_modified, 'Thu, 04 Mar 2021 06:00:00 GMT')
+
+        def get(if_modified_since):
+            # versionの有効期間内に取得する
+            with freeze_time(self.now + timedelta(minutes=5)):
+                return self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=if_modified_since)
+
+        response = get(last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        with freeze_time(self.now + timedelta(minutes=1)), self.captureOnCommitCallbacks(execute=True):
+            comment = CommentFactory(tip=self.tip, no=1)
+        with freeze_time(self.now + timedelta(minutes=2)), self.captureOnCommitCallbacks(execute=True):
+            LikeFactory(tip=self.tip)
+        response = get(last_modified)
+
+        self.assertEqual(response.status_code, 200)
+        last_modified = response['Last-Modified']
+        self.assertEqual(last_modified, 'Thu, 04 Mar 2021 06:02:00 GMT')
+
+        # 日時に残らない変更(コメントの削除、作成者の名前の変更)でも更新されること
+        with freeze_time(self.now + timedelta(minutes=3)), self.captureOnCommitCallbacks(execute=True):
+            comment.delete()
+        response = get(last_modified)
+
+        self.assertEqual(response.status_code, 200)
+        last_modified = response['Last-Modified']
+        self.assertEqual(last_modified, 'Thu, 04 Mar 2021 06:03:00 GMT')
+
+        with freeze_time(self.now + timedelta(minutes=4)), self.captureOnCommitCallbacks(execute=True):
+            self.user.username = 'renamed'
+            self.user.save()
+        response = get(last_modified)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], 'Thu, 04 Mar 2021 06:04:00 GMT')
+
+    def test_not_modified_only_for_visible_tip(self):
+        """ETagが一致しても、非公開・削除済みのtipには304を返さないこと"""
+
+        etag = self.client.get(self.url)['ETag']
+        last_modified = self.client.get(self.url)['Last-Modified']
+        # cacheのversionを上げずに非公開・削除に変更(ページのcacheは削除)
+        cache.delete(f'page:{hashlib.md5(b"http://testserver" + self.url.encode()).hexdigest()}')
+        Tip.objects.filter(pk=self.tip.pk).update(public_set='private')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 403)
+
+        Tip.objects.filter(pk=self.tip.pk).delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_logged_in_user(self):
+        """ログインユーザはLast-Modifiedを返さず、未読のお知らせ件数が変わるとETagが変わること"""
+
+        anonymous_etag = self.client.get(self.url)['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        self.assertNotEqual(etag, anonymous_etag)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notification(RequestFactory().get('/'), self.user, Notification.EVENT, content='お知らせ')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_lists(self):
+        """tip一覧はETagが一致する場合は304を返し、tipの追加後は200を返すこと"""
+
+        for url in [reverse('app:tip_public_list'), reverse('app:usertip', args=[self.user.pk])]:
+            etag = self.client.get(url)['ETag']
+
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TipFactory(created_by=self.user, public_set='public')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.client.force_login(UserFactory())
+        url = reverse('app:tip_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
 class TestTipUpdateView(TestCase):
     
     @classmethod
@@ -933,6 +1177,27 @@ class TestAddComment(TestCase):
         self.assertEqual(notifications[0].created_by, self.non_create_user)
         self.assertEqual(notifications[0].created_at, now)
 
+    def test_post_request_to_many_users(self):
+        """postリクエスト/複数の宛先/全員が宛先に登録され、お知らせは有効なユーザにのみ作成され、宛先の数によらず同じquery数であること"""
+
+        self.client.force_login(self.non_create_user)
+        users = [UserFactory() for _ in range(4)]
+        inactive_user = UserFactory(is_active=False)
+
+        with CaptureQueriesContext(connection) as one_user_queries:
+            self.client.post(self.public_tip_url, {'text': 'コメント', 'toUsersId': [self.create_user.pk]})
+        with CaptureQueriesContext(connection) as many_users_queries:
+            self.client.post(
+                self.public_tip_url, {'text': 'コメント', 'toUsersId': [user.pk for user in users] + [inactive_user.pk]}
+            )
+
+        self.assertEqual(len(many_users_queries), len(one_user_queries))
+        comment = Comment.objects.get(tip=self.public_tip, no=2)
+        self.assertSetEqual(set(comment.to_users.all()), set(users + [inactive_user]))
+        notifications = Notification.objects.filter(tip=self.public_tip, to_user__in=users + [inactive_user])
+        self.assertSetEqual({notification.to_user for notification in notifications}, set(users))
+        self.assertTrue(all(notification.created_by == self.non_create_user for notification in notifications))
+
     def test_post_request_error_about_to_user(self):
         """postリクエスト/public_tip/Tip作成者/宛先なしエラー(通常起きない)"""
         
@@ -1060,6 +1325,7 @@ class TestAddLike(TestCase):
         likes = Like.objects.filter(tip=self.public_tip, created_by=self.non_create_user)
         self.assertEqual(likes.count(), 1)
         self.assertEqual(likes[0].created_at, now)
+        self.assertEqual(Tip.objects.get(pk=self.public_tip.pk).like_count, 1)
         
     def test_get_request_to_public_tip_by_non_crate_user_added_like_error(self):
         """getリクエスト/public_tip/Tip作成者以外(Tip2つ登録済み)/既に登録済みでエラー"""
@@ -1161,6 +1427,7 @@ class TestDeleteLike(TestCase):
         self.assertEqual(str(messages[0]), 'お気に入りから削除しました。')
         likes = Like.objects.filter(tip=self.public_tip, created_by=self.non_create_user)
         self.assertEqual(likes.count(), 0)
+        self.assertEqual(Tip.objects.get(pk=self.public_tip.pk).like_count, 0)
         
     def test_get_request_to_public_tip_by_non_crate_user_deleted_like_error(self):
         """getリクエスト/public_tip/Tip作成者以外/既に削除済みでエラー"""
@@ -1324,7 +1591,7 @@ class TestNotification(TestCase):
         
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'app/notifications.html')
-        self.assertFalse(notifications.exists())
+        self.assertEqual(len(notifications), 0)
         self.assertContains(response, '新しいお知らせはありません。')
         self.assertFalse(Notification.objects.filter(is_read=False).exists())
 
@@ -1349,9 +1616,159 @@ class TestNotification(TestCase):
     def test_get_request_other_notification_access_error(self):
         """getリクエストの自分以外のお知らせアクセス403エラー確認"""
         
+        other_notification = NotificationFactory(to_user=UserFactory(), tip=self.tip, category=Notification.COMMENT)
         self.client.force_login(self.user)
-        response = self.client.get(self.url, {'goto': 'comment', 'notification': '10'})
+        response = self.client.get(self.url, {'goto': 'comment', 'notification': other_notification.pk})
         
         self.assertEqual(response.status_code, 403)
         self.assertTemplateUsed(response, '403.html')
 
+    def test_post_request_to_read_notifications_up_to_id(self):
+        """postリクエストで指定したpkまでのお知らせのみ既読になること"""
+
+        new_notification = NotificationFactory(to_user=self.user, tip=self.tip)
+        other_notification = NotificationFactory(tip=self.tip)
+        up_to_id = max(self.comment_notification.pk, self.event_notification.pk)
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('app:read_notifications'), {'upToId': up_to_id, 'display': 'all'})
+
+        self.assertRedirects(response, self.url + '?display=all', status_code=302, target_status_code=200)
+        self.assertFalse(Notification.objects.filter(pk__lte=up_to_id, to_user=self.user, is_read=False).exists())
+        self.assertFalse(Notification.objects.get(pk=new_notification.pk).is_read)
+        self.assertFalse(Notification.objects.get(pk=other_notification.pk).is_read)
+
+    def test_post_request_to_read_notifications_up_to_time(self):
+        """postリクエスト(ajax)で指定した日時までのお知らせのみ既読になり、件数が返ること"""
+
+        Notification.objects.filter(pk=self.comment_notification.pk).update(
+            created_at=timezone.make_aware(datetime(2021, 3, 4, 15, 0, 0)))
+        Notification.objects.filter(pk=self.event_notification.pk).update(
+            created_at=timezone.make_aware(datetime(2021, 3, 4, 16, 0, 0)))
+
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('app:read_notifications'), {'upToTime': '2021-03-04T15:30:00'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(response.content, {'updated': 1})
+        self.assertTrue(Notification.objects.get(pk=self.comment_notification.pk).is_read)
+        self.assertFalse(Notification.objects.get(pk=self.event_notification.pk).is_read)
+
+    def test_request_to_read_notifications_error(self):
+        """getリクエスト、範囲の指定誤りはエラーになること"""
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('app:read_notifications'), {'upToId': self.event_notification.pk})
+
+        self.assertEqual(response.status_code, 405)
+
+        response = self.client.post(reverse('app:read_notifications'), {'upToTime': 'invalid'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Notification.objects.filter(to_user=self.user, is_read=False).exists())
+
+    @override_settings(NOTIFICATIONS_PAGINATE_BY=2)
+    def test_get_request_with_pagination(self):
+        """getリクエストのpagination確認(受信日時の降順、表示対象を引き継ぐ)"""
+
+        created_at = timezone.make_aware(datetime(2021, 3, 4, 15, 0, 0))
+        Notification.objects.filter(pk=self.comment_notification.pk).update(created_at=created_at)
+        Notification.objects.filter(pk=self.event_notification.pk).update(created_at=created_at)
+        read_notification = NotificationFactory(to_user=self.user, tip=self.tip, is_read=True)
+
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {'display': 'all'})
+        page_obj = response.context['page_obj']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(list(page_obj), [read_notification, self.event_notification])
+        self.assertTrue(page_obj.has_next())
+        self.assertContains(response, 'display=all&amp;cursor=')
+
+        response = self.client.get(self.url, {'display': 'all', 'cursor': page_obj.next_cursor})
+        page_obj = response.context['page_obj']
+
+        self.assertListEqual(list(page_obj), [self.comment_notification])
+        self.assertFalse(page_obj.has_next())
+        self.assertTrue(page_obj.has_previous())
+
+
+class TestNotificationsCount(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.tip = TipFactory(created_by=self.user, public_set='public')
+        self.request = RequestFactory().get('/')
+        self.request.user = UserFactory()
+
+    def test_count_from_db_on_cache_miss(self):
+        """cacheにない場合はDBから取得してcacheに設定されること"""
+
+        NotificationFactory.create_batch(2, to_user=self.user)
+
+        self.assertEqual(get_unread_notifications_count(self.user), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_notifications_count(self.user), 2)
+
+    def test_count_is_refreshed_on_change(self):
+        """お知らせの作成、既読、全て既読でcacheが作り直され、DBの件数が設定されること"""
+
+        self.assertEqual(get_unread_notifications_count(self.user), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notification(self.request, to_user=self.user, category=Notification.COMMENT, tip=self.tip)
+            create_notification(self.request, to_user=self.user, category=Notification.COMMENT, tip=self.tip)
+
+        self.client.force_login(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_unread_notifications_count(self.user), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_notifications_count(self.user), 2)
+        response = self.client.get(reverse('app:index'))
+        self.assertContains(response, 'お知らせ (2)</a>')
+
+        notification = Notification.objects.filter(to_user=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('app:notifications'), {'goto': 'comment', 'notification': notification.pk})
+        self.assertEqual(get_unread_notifications_count(self.user), 1)
+
+        # 既読のお知らせを再度クリックしても減らないこと
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('app:notifications'), {'goto': 'comment', 'notification': notification.pk})
+        self.assertEqual(get_unread_notifications_count(self.user), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('app:notifications'), {'allRead': 'done'})
+        self.assertEqual(get_unread_notifications_count(self.user), 0)
+
+    def test_count_changed_while_counting(self):
+        """DBから件数を取得してcacheに設定するまでの間に作成されたお知らせが、cacheの件数から失われないこと"""
+
+        original_count = QuerySet.count
+
+        def count_and_create(queryset):
+            count = original_count(queryset)
+            # 件数の取得後、cacheへの設定前に他のリクエストでお知らせが作成された状態にする
+            with self.captureOnCommitCallbacks(execute=True):
+                create_notification(self.request, to_user=self.user, category=Notification.COMMENT, tip=self.tip)
+            return count
+
+        with mock.patch.object(QuerySet, 'count', count_and_create):
+            get_unread_notifications_count(self.user)
+
+        self.assertEqual(get_unread_notifications_count(self.user), 1)
+
+    def test_count_is_changed_by_tip_deletion(self):
+        """tipの削除で未読のお知らせが削除された場合にcacheの件数が減ること"""
+
+        NotificationFactory(to_user=self.user, tip=self.tip)
+        NotificationFactory(to_user=self.user, tip=self.tip, is_read=True)
+        NotificationFactory(to_user=self.user)
+        self.assertEqual(get_unread_notifications_count(self.user), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tip.delete()
+
+        self.assertEqual(get_unread_notifications_count(self.user), 1)
@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import TimelineEntry, Tip
+from .pagination import CursorPage, InvalidCursor
+
+# フォローの中間テーブル(from_user: フォローしたユーザ、to_user: フォローされたユーザ)
+Follow = get_user_model().follows.through
+
+
+def is_fanout_target(user_id):
+    """
+    ユーザのtipを書き込み時にフォロワーのタイムラインに展開するかどうか
+    フォロワーが多いユーザのtipは展開せず、タイムラインの表示時に取得する
+    """
+    return get_user_model().objects.filter(
+        pk=user_id, followers_count__lte=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).exists()
+
+
+def fanout_tip(tip_id):
+    """tipをtip作成者のフォロワーのタイムラインに展開する(publicでない場合は削除する)"""
+    tip = Tip.objects.filter(pk=tip_id).first()
+    if tip is None:
+        return
+    if tip.public_set != Tip.PUBLIC:
+        TimelineEntry.objects.filter(tip=tip).delete()
+        return
+    if not is_fanout_target(tip.created_by_id):
+        return
+
+    # 展開済みの項目の並び順を更新し、未展開のフォロワーに追加
+    TimelineEntry.objects.filter(tip=tip).update(tip_updated_at=tip.updated_at)
+    last_pk = 0
+    while True:
+        follows = list(
+            Follow.objects.filter(to_user_id=tip.created_by_id, pk__gt=last_pk)
+            .order_by('pk').values_list('pk', 'from_user_id')[:settings.TIMELINE_FANOUT_BATCH_SIZE]
+        )
+        if not follows:
+            break
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, tip=tip, tip_updated_at=tip.updated_at) for _, user_id in follows],
+            ignore_conflicts=True,
+        )
+        last_pk = follows[-1][0]
+
+
+def add_timeline_entries(user_id, tips):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, tip_id=tip_id, tip_updated_at=updated_at) for tip_id, updated_at in tips],
+        ignore_conflicts=True,
+    )
+
+
+def add_followee_tips(user_id, followee_id):
+    """フォローしたユーザの最新のtipをタイムラインに追加する"""
+    tips = (
+        Tip.objects.filter(created_by_id=followee_id, public_set=Tip.PUBLIC)
+        .order_by('-updated_at').values_list('pk', 'updated_at')[:settings.TIMELINE_BACKFILL_LIMIT]
+    )
+    add_timeline_entries(user_id, tips)
+
+
+def remove_followee_tips(user_id, followee_id):
+    """フォロー解除したユーザのtipをタイムラインから削除する"""
+    TimelineEntry.objects.filter(user_id=user_id, tip__created_by_id=followee_id).delete()
+
+
+def rebuild_timeline(user_id):
+    """フォローしているユーザ(フォロワーが多いユーザを除く)の最新のtipをタイムラインに追加する"""
+    followee_ids = Follow.objects.filter(
+        from_user_id=user_id, to_user__followers_count__lte=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).values('to_user_id')
+    tips = (
+        Tip.objects.filter(created_by_id__in=followee_ids, public_set=Tip.PUBLIC)
+        .order_by('-updated_at').values_list('pk', 'updated_at')[:settings.TIMELINE_BACKFILL_LIMIT]
+    )
+    add_timeline_entries(user_id, tips)
+
+
+def get_unfanned_followee_ids(user_id):
+    """フォローしているユーザのうち、tipをタイムラインに展開しない(フォロワーが多い)ユーザのpkを返す"""
+    return list(
+        Follow.objects.filter(from_user_id=user_id, to_user__followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS)
+        .values_list('to_user_id', flat=True)
+    )
+
+
+class TimelinePaginator:
+    """
+    タイムラインのpaginator(次ページのみ)
+    タイムラインの項目(TimelineEntry)と、フォロワーが多いユーザのtipを
+    (updated_at, pk)の降順でそれぞれindexの範囲で取得してマージする
+    """
+    salt = 'app.timeline.TimelinePaginator'
+
+    def __init__(self, user, per_page):
+        self.user = user
+        self.per_page = int(per_page)
+
+    def encode_cursor(self, tip, direction):
+        updated_at, pk = tip.timeline_key
+        return signing.dumps({'t': updated_at.isoformat(), 'id': pk}, salt=self.salt)
+
+    def decode_cursor(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=self.salt)
+            updated_at = parse_datetime(data['t'])
+            pk = int(data['id'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise InvalidCursor('ページの指定が正しくありません。')
+        if updated_at is None:
+            raise InvalidCursor('ページの指定が正しくありません。')
+        return updated_at, pk
+
+    def _get_keys(self, queryset, updated_at_field, pk_field, cursor_key):
+        if cursor_key is not None:
+            updated_at, pk = cursor_key
+            queryset = queryset.filter(
+                Q(**{f'{updated_at_field}__lt': updated_at})
+                | Q(**{updated_at_field: updated_at, f'{pk_field}__lt': pk})
+            )
+        return list(
+            queryset.order_by(f'-{updated_at_field}', f'-{pk_field}')
+            .values_list(updated_at_field, pk_field)[:self.per_page + 1]
+        )
+
+    def page(self, cursor=None):
+        cursor_key = self.decode_cursor(cursor) if cursor else None
+
+        keys = self._get_keys(TimelineEntry.objects.filter(user=self.user), 'tip_updated_at', 'tip_id', cursor_key)
+        unfanned_followee_ids = get_unfanned_followee_ids(self.user.pk)
+        if unfanned_followee_ids:
+            tips = Tip.objects.filter(created_by_id__in=unfanned_followee_ids, public_set=Tip.PUBLIC)
+            keys += self._get_keys(tips, 'updated_at', 'pk', cursor_key)
+
+        # 降順に並べ替えて重複を除く
+        keys = list({pk: (updated_at, pk) for updated_at, pk in sorted(keys)}.values())
+        keys.sort(reverse=True)
+        has_next = len(keys) > self.per_page
+        keys = keys[:self.per_page]
+
+        tips = Tip.objects.filter(pk__in=[pk for _, pk in keys], public_set=Tip.PUBLIC) \
+            .select_related('created_by').prefetch_related('tags').in_bulk()
+        object_list = []
+        for key in keys:
+            tip = tips.get(key[1])
+            if tip is not None:
+                tip.timeline_key = key
+                object_list.append(tip)
+
+        return CursorPage(object_list, self, has_next=has_next, has_previous=False)
@@ -0,0 +1,46 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# CJK(ひらがな、カタカナ、漢字)の文字範囲
+CJK_CHARS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+
+
+class NgramTokenizer:
+    """
+    検索用のtokenizer
+    CJKの文字列をn-gram(bigram)に分割する(各文字列の末尾1文字も1-gramとして追加)
+    英数字の単語は単語の途中から一致する場合(syncでasyncio等)も検索するため、tokenにしない
+    (単語はsearch_documentの部分一致で判定する)
+    """
+    ngram = 2
+    pattern = re.compile(rf'[{CJK_CHARS}]+')
+
+    def normalize(self, text):
+        """全角半角を統一して小文字化"""
+        return unicodedata.normalize('NFKC', text or '').lower()
+
+    def tokenize(self, text):
+        """textをtokenに分割して返す"""
+        for cjk in self.pattern.findall(self.normalize(text)):
+            for i in range(len(cjk) - self.ngram + 1):
+                yield cjk[i:i + self.ngram]
+            yield cjk[-1]
+
+    def tokenize_query(self, query):
+        """検索内容を(token, 前方一致かどうか)に分割して返す(CJKの1文字は前方一致で検索する)"""
+        tokens = []
+        for cjk in self.pattern.findall(self.normalize(query)):
+            if len(cjk) < self.ngram:
+                tokens.append((cjk, True))
+            else:
+                tokens += [(cjk[i:i + self.ngram], False) for i in range(len(cjk) - self.ngram + 1)]
+        # 重複を除く(順序は維持)
+        return list(dict.fromkeys(tokens))
+
+
+def get_tokenizer():
+    """settings.TIP_SEARCH_TOKENIZERのtokenizerを返す"""
+    return import_string(settings.TIP_SEARCH_TOKENIZER)()
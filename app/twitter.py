@@ -0,0 +1,31 @@
+import tweepy
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class TweepyClient:
+    """tweepyでTwitterに投稿するclient"""
+
+    def __init__(self):
+        auth = tweepy.OAuthHandler(settings.TWITTER_CONSUMER_KEY, settings.TWITTER_CONSUMER_SECRET)
+        auth.set_access_token(settings.TWITTER_ACCESS_TOKEN, settings.TWITTER_ACCESS_SECRET)
+        self.api = tweepy.API(auth)
+
+    def update_status(self, status):
+        self.api.update_status(status)
+
+
+class LocalTwitterClient:
+    """
+    Twitterに投稿せず、outboxに保存するclient(開発、テスト用)
+    django.core.mail.outboxと同様に、投稿内容はLocalTwitterClient.outboxで確認する
+    """
+    outbox = []
+
+    def update_status(self, status):
+        self.outbox.append(status)
+
+
+def get_twitter_client():
+    """settings.TWITTER_CLIENTのclientを返す"""
+    return import_string(settings.TWITTER_CLIENT)()
@@ -12,6 +12,7 @@ urlpatterns = [
     path('tip_delete/<int:pk>/', views.TipDeleteView.as_view(), name='tip_delete'),
     path('tip_list/', views.TipMyListView.as_view(), name='tip_list'),
     path('tip_public_list/', views.TipPublicListView.as_view(), name='tip_public_list'),
+    path('timeline/', views.TimelineView.as_view(), name='timeline'),
     path('add_comment/<int:pk>/', views.add_comment, name='add_comment'),
     path('delete_comment/<int:pk>/<int:comment_no>/', views.delete_comment, name='delete_comment'),
     path('add_like/<int:pk>/', views.add_like, name='add_like'),
@@ -19,6 +20,7 @@ urlpatterns = [
     path('contact/', views.ContactView.as_view(), name='contact'),
     path('thanks/', views.ThanksView.as_view(), name='thanks'),
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/read/', views.read_notifications, name='read_notifications'),
     path('terms/', views.TermsView.as_view(), name='terms'),
     path('policy/', views.PolicyView.as_view(), name='policy'),
     path('usertip/<int:id>/', views.UserTipView.as_view(), name='usertip'),
@@ -1,3 +1,9 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
 from .models import Notification
 
 
@@ -19,3 +25,69 @@ def create_notification(request, to_user, category, tip=None, content=None):
             content=content,
             created_by=created_by
         )
+        invalidate_unread_notifications_count([to_user.pk])
+
+
+def bulk_create_notifications(to_user_ids, category, tip_id=None, content='', created_by_id=None, dedup_key=''):
+    """
+    to_user_ids(ユーザのpkのリスト)へのお知らせを1回のqueryで作成する
+    dedup_keyを指定した場合、同じkeyで作成済みのユーザには作成しない
+    """
+    Notification.objects.bulk_create(
+        [
+            Notification(
+                to_user_id=to_user_id, category=category, tip_id=tip_id, content=content,
+                created_by_id=created_by_id, dedup_key=dedup_key,
+            )
+            for to_user_id in to_user_ids
+        ],
+        ignore_conflicts=bool(dedup_key),
+    )
+    invalidate_unread_notifications_count(to_user_ids)
+
+
+def unread_notifications_version_key(user_id):
+    return f'notifications:unread_version:{user_id}'
+
+
+def get_unread_notifications_version(user_id):
+    """未読のお知らせ件数のcacheのversionを返す(cacheにない場合は作成)"""
+    key = unread_notifications_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # cacheから消えた後に再設定しても、以前のversionと重複しない値にする
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, settings.NOTIFICATIONS_COUNT_CACHE_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def unread_notifications_count_key(user_id, version):
+    return f'notifications:unread_count:{user_id}:{version}'
+
+
+def get_unread_notifications_count(user):
+    """
+    未読のお知らせ件数を返す(cacheにない場合はDBから取得してcacheに設定)
+    件数の増減はcacheに反映せず、お知らせの作成・既読・削除時にversionを上げて作り直す
+    (DBからの取得とcacheへの設定の間に変更された場合、古い件数は前のversionに設定され使用されない)
+    """
+    key = unread_notifications_count_key(user.pk, get_unread_notifications_version(user.pk))
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(to_user=user, is_read=False).count()
+        cache.add(key, count, settings.NOTIFICATIONS_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def invalidate_unread_notifications_count(user_ids):
+    """未読のお知らせ件数のcacheのversionを上げる(DBのcommit後に反映、次回の取得時にDBから設定される)"""
+    def invalidate():
+        for user_id in user_ids:
+            try:
+                cache.incr(unread_notifications_version_key(user_id))
+            except ValueError:
+                # versionがない場合は、次回の取得時に新しいversionで作成されるため何もしない
+                pass
+
+    transaction.on_commit(invalidate)
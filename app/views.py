@@ -1,6 +1,4 @@
 import textwrap
-import tweepy
-import logging
 
 from django.conf import settings
 from django.contrib import messages
@@ -9,15 +7,27 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.exceptions import PermissionDenied
 from django.core.mail import BadHeaderError, EmailMessage
-from django.db.models import Count, Q
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
+                         HttpResponseRedirect, JsonResponse)
 from django.shortcuts import get_object_or_404, redirect, render, resolve_url
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
 from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import require_POST
 from django.views.generic import (CreateView, DeleteView, DetailView, ListView,
                                   TemplateView, UpdateView, View)
 
+from .caching import CachePageMixin, ConditionalGetMixin, get_cache_version
 from .forms import CommentForm, ContactForm, TipForm
 from .models import Code, Comment, Like, Notification, Tip
+from .pagination import CursorPaginationMixin, CursorPaginator, InvalidCursor
+from .search import search_tips
+from .tasks import enqueue_tweet
+from .timeline import TimelinePaginator
+from .utils import invalidate_unread_notifications_count
 
 
 # tip作成者のみ処理可能
@@ -42,6 +52,9 @@ def get_detail_context(user, tip, context):
     context['comments_distinct'] = comments.order_by('created_by_id').distinct().values('created_by_id', 'created_by__username')
     # コードを設定
     context['codes'] = Code.objects.filter(tip=tip)
+    # tipの内容の表示をcacheするkeyのversionを設定(未ログインユーザにはページ全体をcache)
+    context['cache_timeout'] = settings.PAGE_CACHE_TIMEOUT
+    context['tip_cache_version'] = get_cache_version(f'tip:{tip.pk}')
     
     return context
 
@@ -51,7 +64,7 @@ def tips_filter_and_order_by_with_request(request, queryset):
     tipのquerysetに対してrequestのパラメータを基に以下の処理をしてquerysetを返す
     ・検索対象(searchTarget)でfilter
     ・検索内容(query,tagQuery)でfilter
-    ・表示順(displayOrder)でorder_by
+    ・表示順(displayOrder: updated,liked,relevance)でorder_by
     """
 
     # 表示対象で抽出
@@ -70,17 +83,20 @@ def tips_filter_and_order_by_with_request(request, queryset):
     tagquery = request.GET.get('tagQuery','')
 
     if query:
-        queryset = queryset.filter(
-            Q(title__icontains=query) | Q(description__icontains=query) | Q(codes__filename__icontains=query) | Q(codes__content__icontains=query)
-        ).distinct()
+        # 検索用文書(search_document)で抽出(codesとのjoin,distinctは不要)
+        queryset = search_tips(queryset, query)
     if tagquery:
-        queryset = queryset.filter(tags__name__icontains=tagquery)
+        # tagsとのjoinで行が重複しないよう、subqueryで抽出
+        queryset = queryset.filter(pk__in=Tip.objects.filter(tags__name__icontains=tagquery).values('pk'))
 
     # 表示順で並び替え
     display_order = request.GET.get('displayOrder','')
 
     if display_order == 'liked':
-        queryset = queryset.annotate(num_likes=Count('likes')).order_by('-num_likes', '-updated_at')
+        queryset = queryset.order_by('-like_count', '-updated_at')
+    elif display_order == 'relevance' and 'search_rank' in queryset.query.annotations:
+        # 関連度順(PostgreSQLでqueryがある場合のみ)
+        queryset = queryset.order_by('-search_rank', '-updated_at')
     else:
         queryset = queryset.order_by('-updated_at')
 
@@ -103,20 +119,10 @@ class TipCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.created_by = self.request.user
         self.object = form.save()
-        # publicかつヒトコトに入力があれば、twitterに投稿する
+        # publicかつヒトコトに入力があれば、twitterへの投稿を登録する(workerで非同期に投稿)
         if self.object.public_set == Tip.PUBLIC and self.object.tweet:
-            try:
-                auth = tweepy.OAuthHandler(settings.TWITTER_CONSUMER_KEY, settings.TWITTER_CONSUMER_SECRET)
-                auth.set_access_token(settings.TWITTER_ACCESS_TOKEN, settings.TWITTER_ACCESS_SECRET)
-                api = tweepy.API(auth)
-                tweet_message = f'{self.object.tweet} https://www.tipstock.info/tip_detail/{self.object.pk}/'
-                api.update_status(tweet_message)
-                messages.success(self.request, 'Twitterに投稿しました。')
-                self.object.has_tweeted = True
-                self.object.save()
-            except:
-                logging.exception("tweepy error")
-                messages.warning(self.request, '制限等の理由でTwitterの投稿ができませんでした。ごめんなさい。')
+            enqueue_tweet(self.object)
+            messages.success(self.request, 'Twitterへの投稿を受け付けました。')
 
         return HttpResponseRedirect(self.get_success_url())
 
@@ -125,8 +131,22 @@ class TipCreateView(LoginRequiredMixin, CreateView):
         return resolve_url('app:tip_list')
 
 
-class TipDetailView(DetailView):
+class TipDetailView(ConditionalGetMixin, CachePageMixin, DetailView):
     model = Tip
+
+    def get_cache_scopes(self):
+        return [f'tip:{self.kwargs["pk"]}', 'users']
+
+    def get_last_modified(self):
+        # tipの更新日時、最新のコメント・お気に入りの日時のうち最新のもの(publicのtipのみ)
+        comments = Comment.objects.filter(tip=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+        likes = Like.objects.filter(tip=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+        dates = Tip.objects.filter(pk=self.kwargs['pk'], public_set=Tip.PUBLIC).values_list(
+            'updated_at', Subquery(comments), Subquery(likes)
+        ).first()
+        if dates is None:
+            return None
+        return max(date for date in dates if date is not None)
     
     def get_object(self):
         obj = super().get_object()
@@ -143,18 +163,21 @@ class TipDetailView(DetailView):
         return context
 
     def get_queryset(self):
-        queryset = Tip.objects.all().annotate(like_count=Count("likes"))
+        queryset = Tip.objects.all().select_related('created_by')
         
         return queryset
 
 
-class TipPublicListView(ListView):
+class TipPublicListView(ConditionalGetMixin, CachePageMixin, CursorPaginationMixin, ListView):
     model = Tip
     paginate_by = 12
 
+    def get_cache_scopes(self):
+        return ['tips', 'users']
+
     def get_queryset(self):
 
-        queryset = Tip.objects.filter(public_set=Tip.PUBLIC).annotate(like_count=Count("likes")).select_related('created_by').prefetch_related('tags')
+        queryset = Tip.objects.filter(public_set=Tip.PUBLIC).select_related('created_by').prefetch_related('tags')
 
         # querysetをrequestの内容でfilterとorder_by
         if queryset.exists():
@@ -173,16 +196,22 @@ class TipPublicListView(ListView):
         return context
 
 
-class TipMyListView(LoginRequiredMixin, ListView):
+class TipMyListView(LoginRequiredMixin, ConditionalGetMixin, CursorPaginationMixin, ListView):
     model = Tip
     paginate_by = 12
 
+    def get_cache_scopes(self):
+        # お気に入りした他のユーザのtipも表示するため、全てのtipのversionを使用
+        return ['tips', 'users']
+
     def get_queryset(self):
         path = self.request.path_info
 
+        # お気に入りはsubqueryで抽出(likesとのjoinで行が重複しないようにする)
+        liked_tips = Like.objects.filter(created_by=self.request.user).values('tip_id')
         queryset = Tip.objects.filter(
-            Q(created_by=self.request.user) | Q(likes__created_by=self.request.user, public_set=Tip.PUBLIC)
-        ).annotate(like_count=Count("likes")).select_related('created_by').prefetch_related('tags')
+            Q(created_by=self.request.user) | Q(pk__in=liked_tips, public_set=Tip.PUBLIC)
+        ).select_related('created_by').prefetch_related('tags')
 
         # querysetをrequestの内容でfilterとorder_by
         if queryset.exists():
@@ -201,6 +230,22 @@ class TipMyListView(LoginRequiredMixin, ListView):
         return context
 
 
+class TimelineView(LoginRequiredMixin, TemplateView):
+    """フォローしているユーザのpublicのtipを更新日時の降順に表示"""
+    template_name = 'app/timeline.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        paginator = TimelinePaginator(self.request.user, settings.TIMELINE_PAGINATE_BY)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        context['page_obj'] = page
+        context['object_list'] = page.object_list
+        return context
+
+
 class TipUpdateView(OnlyMyTipMixin, UpdateView):
     model = Tip
     form_class = TipForm
@@ -212,20 +257,10 @@ class TipUpdateView(OnlyMyTipMixin, UpdateView):
     
     def form_valid(self, form):
         self.object = form.save()
-        # publicかつヒトコトに入力があれば、twitterに投稿する
+        # publicかつヒトコトに入力があれば、twitterへの投稿を登録する(workerで非同期に投稿)
         if self.object.public_set == Tip.PUBLIC and self.object.tweet and not self.object.has_tweeted:
-            try:
-                auth = tweepy.OAuthHandler(settings.TWITTER_CONSUMER_KEY, settings.TWITTER_CONSUMER_SECRET)
-                auth.set_access_token(settings.TWITTER_ACCESS_TOKEN, settings.TWITTER_ACCESS_SECRET)
-                api = tweepy.API(auth)
-                tweet_message = f'{self.object.tweet} https://www.tipstock.info/tip_detail/{self.object.pk}/'
-                api.update_status(tweet_message)
-                messages.success(self.request, 'Twitterに投稿しました。')
-                self.object.has_tweeted = True
-                self.object.save()
-            except:
-                logging.exception("tweepy error")
-                messages.warning(self.request, '制限等の理由でTwitterの投稿ができませんでした。ごめんなさい。')
+            enqueue_tweet(self.object)
+            messages.success(self.request, 'Twitterへの投稿を受け付けました。')
 
         return HttpResponseRedirect(self.get_success_url())
 
@@ -248,7 +283,7 @@ class TipDeleteView(OnlyMyTipMixin, DeleteView):
 
 @login_required
 def add_comment(request, pk):
-    tips = Tip.objects.filter(pk=pk).annotate(like_count=Count("likes"))
+    tips = Tip.objects.filter(pk=pk)
     
     if tips.exists():
         tip = tips[0]
@@ -319,8 +354,10 @@ def add_like(request, pk):
         messages.error(request, 'お気に入りへの追加は２つ以上のTip登録が必要です。')
         return redirect('app:tip_detail', pk=pk)
 
-    like = Like(created_by=request.user, tip=tip)
-    like.save()
+    # Likeの登録とお気に入り数(like_count)の加算を同一トランザクションで行う
+    with transaction.atomic():
+        like = Like(created_by=request.user, tip=tip)
+        like.save()
     messages.success(request, 'お気に入りに追加しました。')
     return redirect('app:tip_detail', pk=pk)
 
@@ -335,7 +372,9 @@ def delete_like(request, pk):
         messages.info(request, 'すでにお気に入りから削除済みです。')
         return redirect('app:tip_detail', pk=pk)
 
-    like.delete()
+    # Likeの削除とお気に入り数(like_count)の減算を同一トランザクションで行う
+    with transaction.atomic():
+        like.delete()
     messages.success(request, 'お気に入りから削除しました。')
     return redirect('app:tip_detail', pk=pk)
 
@@ -418,8 +457,9 @@ def notifications(request):
             raise PermissionDenied('そのお知らせへのアクセスは禁止されています。')
 
         if notification.is_read == False:
-            notification.is_read = True
-            notification.save()
+            # 未読の場合のみ更新し、未読件数のcacheを作り直す
+            if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+                invalidate_unread_notifications_count([request.user.pk])
 
         if notification.category == Notification.COMMENT:
             return redirect('app:tip_detail', pk=notification.tip.pk)
@@ -436,12 +476,9 @@ def notifications(request):
     all_read = request.GET.get('allRead', '')
 
     if all_read == 'done':
-        update_notifications = []
-        for notification in notifications:
-            if notification.is_read == False:
-                notification.is_read = True
-                update_notifications.append(notification)
-        Notification.objects.bulk_update(update_notifications, fields=['is_read'])
+        # 1つのupdate文で未読のお知らせを既読に更新
+        Notification.objects.filter(to_user=request.user, is_read=False).update(is_read=True)
+        invalidate_unread_notifications_count([request.user.pk])
 
     # 全てをクリック
     display = request.GET.get('display', '')
@@ -449,11 +486,62 @@ def notifications(request):
     if display != 'all':
         notifications = notifications.filter(is_read=False)
 
+    # 受信日時の降順にcursor方式でページング(未確認のみの場合は未確認用のindexを使用)
+    notifications = notifications.order_by('-created_at', '-pk')
+    paginator = CursorPaginator(notifications, settings.NOTIFICATIONS_PAGINATE_BY)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor as e:
+        raise Http404(str(e))
+
     return render(request, 'app/notifications.html', {
-        'notifications': notifications
+        'notifications': page,
+        'page_obj': page,
+        # 表示時点の最新のお知らせのpk(既読にする範囲の指定に使用)
+        'latest_notification_id': notifications.values_list('pk', flat=True).first() or 0,
     })
 
 
+@login_required
+@require_POST
+def read_notifications(request):
+    """
+    指定したpk(upToId)、または日時(upToTime)以前の未読のお知らせを既読にする
+    表示した時点までのお知らせのみを既読にするため、表示後に届いたお知らせは未読のまま残る
+    """
+    up_to_id = request.POST.get('upToId', '')
+    up_to_time = request.POST.get('upToTime', '')
+    unread_notifications = Notification.objects.filter(to_user=request.user, is_read=False)
+
+    try:
+        if up_to_id:
+            unread_notifications = unread_notifications.filter(pk__lte=int(up_to_id))
+        elif up_to_time:
+            up_to_time = parse_datetime(up_to_time)
+            if up_to_time is None:
+                raise ValueError
+            if timezone.is_naive(up_to_time):
+                up_to_time = timezone.make_aware(up_to_time)
+            unread_notifications = unread_notifications.filter(created_at__lte=up_to_time)
+        else:
+            raise ValueError
+    except ValueError:
+        return HttpResponseBadRequest('既読にする範囲の指定が正しくありません。')
+
+    updated_count = unread_notifications.update(is_read=True)
+    if updated_count:
+        invalidate_unread_notifications_count([request.user.pk])
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'updated': updated_count})
+
+    response = redirect('app:notifications')
+    display = request.POST.get('display', '')
+    if display:
+        response['Location'] += '?' + urlencode({'display': display})
+    return response
+
+
 class TermsView(TemplateView):
     template_name = 'app/terms.html'
     
@@ -462,10 +550,13 @@ class PolicyView(TemplateView):
     template_name = 'app/policy.html'
 
 
-class UserTipView(ListView):
+class UserTipView(ConditionalGetMixin, CachePageMixin, CursorPaginationMixin, ListView):
     model = Tip
     template_name = 'app/usertip.html'
     paginate_by = 12
+
+    def get_cache_scopes(self):
+        return [f'user:{self.kwargs["id"]}', 'users']
     
     def get(self, request, *args, **kwargs):
         if request.user.id == self.kwargs['id']:
@@ -474,7 +565,7 @@ class UserTipView(ListView):
 
     def get_queryset(self):
         
-        queryset = Tip.objects.filter(created_by_id=self.kwargs['id'], public_set=Tip.PUBLIC).annotate(like_count=Count("likes")).select_related('created_by').prefetch_related('tags')
+        queryset = Tip.objects.filter(created_by_id=self.kwargs['id'], public_set=Tip.PUBLIC).select_related('created_by').prefetch_related('tags')
         
         # querysetをrequestの内容でfilterとorder_by
         if queryset.exists():
@@ -66,6 +66,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 他のmiddlewareがcookieを設定したレスポンスをCDNでcacheしないため、先頭に追加
+    'app.caching.PageCacheCookieMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -231,4 +233,76 @@ AXES_RESET_ON_SUCCESS = True
 MAINTENANCE_MODE_IGNORE_ADMIN_SITE = True
 MAINTENANCE_MODE_IGNORE_SUPERUSER = True
 SENDGRID_TRACK_CLICKS_HTML = False
-SENDGRID_TRACK_CLICKS_PLAIN = False
\ No newline at end of file
+SENDGRID_TRACK_CLICKS_PLAIN = False
+
+# Tip検索の設定
+TIP_SEARCH_TOKENIZER = 'app.tokenizers.NgramTokenizer'  # 転置インデックスのtokenizer
+TIP_SEARCH_INDEX_ENABLED = True  # 検索時に転置インデックスで候補を絞り込む
+
+# Tip一覧のページングをcursor方式にする(件数を数えず、OFFSETを使わない)
+TIP_LIST_CURSOR_PAGINATION = False
+
+# 未読のお知らせ件数のcacheの有効期間(秒)
+NOTIFICATIONS_COUNT_CACHE_TIMEOUT = 60 * 60
+
+# お知らせ一覧の1ページの表示件数
+NOTIFICATIONS_PAGINATE_BY = 20
+
+# job(非同期処理)の設定
+JOB_MAX_ATTEMPTS = 5  # 最大試行回数(超えた場合は失敗)
+JOB_RETRY_BACKOFF = 60  # 再試行までの待機秒数(試行ごとに2倍)
+JOB_RETRY_BACKOFF_MAX = 60 * 60  # 再試行までの最大待機秒数
+JOB_LEASE_TIMEOUT = 60 * 5  # workerの処理期限の秒数(過ぎた場合は再度処理する)
+JOB_RETENTION_DAYS = 30  # 完了したjob、送信済みのメールの保存日数(purge_finished_jobsコマンドで削除)
+
+# Twitterへの投稿に使用するclient(app.twitter.LocalTwitterClientは投稿せずに保存のみ)
+TWITTER_CLIENT = 'app.twitter.TweepyClient'
+
+# 送信待ちのメール(app.mail.QueuedEmailBackendで登録)を送信するbackend
+EMAIL_OUTBOX_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+# フォロー・フォロワー一覧の1ページの表示件数
+FOLLOWS_PAGINATE_BY = 20
+
+# タイムラインの設定
+TIMELINE_PAGINATE_BY = 12  # 1ページの表示件数
+TIMELINE_FANOUT_MAX_FOLLOWERS = 1000  # 超えるユーザのtipはタイムラインに展開せず、表示時に取得する
+TIMELINE_FANOUT_BATCH_SIZE = 1000  # 展開時に1回で登録する件数
+TIMELINE_BACKFILL_LIMIT = 100  # フォロー時、再作成時にタイムラインに追加するtipの件数
+
+# お知らせの一括作成の設定
+NOTIFICATIONS_BATCH_SIZE = 1000  # 1回で登録する件数
+NOTIFICATIONS_ASYNC_THRESHOLD = 1000  # 宛先が超える場合はjobでworkerに任せる
+
+# 既読のお知らせの保存日数(purge_notificationsコマンドで削除)
+NOTIFICATIONS_RETENTION_DAYS = 180
+
+# ユーザの統計(プロフィールのtipの件数、フォロワー数等)のcacheの有効期間(秒)
+USER_STATS_CACHE_TIMEOUT = 60 * 60
+
+# 退会したユーザのデータを削除するjobで1回に削除する件数
+WITHDRAWAL_PURGE_BATCH_SIZE = 100
+
+# cache(本番環境では複数のプロセスで共有するcacheを使用すること)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tipstock',
+    }
+}
+
+# 未ログインユーザへのページ(tip一覧等)のcacheの有効期間(秒)
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# cacheの作り直しの設定(app.caching.get_or_compute)
+CACHE_STALE_TIMEOUT = 60 * 60  # 期限切れ後も作り直すまでの間に古い値として使用する秒数
+CACHE_LOCK_TIMEOUT = 30  # 作り直すworkerのlockの有効期間(秒)
+
+# コードのシンタックスハイライトのcacheの有効期間(秒)
+HIGHLIGHT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# CDNの設定(未ログインユーザへのページのcache)
+CDN_CACHE_TIMEOUT = 60 * 10  # CDNでcacheする秒数(tip等の変更時はSurrogate-Keyで削除、削除に失敗しても古いページを長く返さない長さにする)
+CDN_PURGE_BACKEND = None  # CDNのcacheを削除するbackend(未設定の場合は削除しない)
+CDN_PURGE_DELAY = 60  # 削除を登録してから実行するまでの秒数(この間の削除はまとめて1回で実行する)
+CDN_PURGE_MAX_PATHS = 5  # 1回の削除で無効化するパスの最大数(超える場合はページ全体を無効化する)
\ No newline at end of file
@@ -39,4 +39,9 @@ STATICFILES_STORAGE = 'config.storage_backends.CollectStaticStorage'
 
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+EMAIL_OUTBOX_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 BCC_EMAIL = 'test@test.com'
+
+
+# Twitter settings
+TWITTER_CLIENT = 'app.twitter.LocalTwitterClient'
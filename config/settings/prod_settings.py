@@ -1,5 +1,6 @@
 import environ
 import requests
+from django.core.exceptions import ImproperlyConfigured
 
 from .base import *
 
@@ -37,6 +38,16 @@ DATABASES = {
 }
 DATABASES['default']['ATOMIC_REQUESTS'] = True
 
+# Cache(ページのcacheのversion、lock、未読件数等を全てのcontainer・workerで共有するため、
+# CACHE_URLで共有のcache(rediscache://等)を必ず指定する)
+CACHES = {
+    'default': env.cache('CACHE_URL')
+}
+if CACHES['default']['BACKEND'] in (
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache',
+):
+    raise ImproperlyConfigured('CACHE_URLには全てのworkerで共有するcache(rediscache://等)を指定してください。')
+
 
 # Logging
 LOGGING = {
@@ -78,7 +89,9 @@ LOGGING = {
 
 # Email settings
 # SendGrid使用時の設定
-EMAIL_BACKEND = 'sendgrid_backend.SendgridBackend'
+# メールは送信待ちに登録し、worker(send_queued_emailsコマンド)がSendGridで送信する
+EMAIL_BACKEND = 'app.mail.QueuedEmailBackend'
+EMAIL_OUTBOX_BACKEND = 'sendgrid_backend.SendgridBackend'
 SENDGRID_API_KEY = env('SENDGRID_API_KEY')
 BCC_EMAIL = env('BCC_EMAIL')
 SENDGRID_SANDBOX_MODE_IN_DEBUG = False
@@ -109,6 +122,9 @@ STATICFILES_STORAGE = 'config.storage_backends.PublicStaticStorage'
 AWS_MEDIA_LOCATION = 'media'
 MEDIA_URL = f'https://{AWS_CLOUDFRONT_DOMAIN}/{AWS_MEDIA_LOCATION}/'
 DEFAULT_FILE_STORAGE = 'config.storage_backends.PublicMediaStorage'
+# CloudFrontでcacheしたページの削除(distributionが未設定の場合は削除しない)
+AWS_CLOUDFRONT_DISTRIBUTION_ID = os.environ.get('AWS_CLOUDFRONT_DISTRIBUTION_ID')
+CDN_PURGE_BACKEND = 'app.cdn.CloudFrontPurgeBackend' if AWS_CLOUDFRONT_DISTRIBUTION_ID else None
 
 # twitter API
 TWITTER_CONSUMER_KEY = env('TWITTER_CONSUMER_KEY')